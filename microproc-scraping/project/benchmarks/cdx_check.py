@@ -0,0 +1,137 @@
+import json
+import tempfile
+from urllib.parse import parse_qs, urlsplit
+
+import pandas
+import project.sample.http_cache as http_cache
+import project.sample.ldlc_archive_scraper as las
+from project.benchmarks.fetch_benchmark import StubHandler, start_stub_server
+from project.benchmarks.process_df_benchmark import synthetic_cdx
+
+NUM_CAPTURES = 5000
+PAGE_SIZE = 700
+
+
+def build_index(size):
+    """ Builds the captures served by the stub CDX server, with failed, non-HTML and repeated ones. """
+
+    df = synthetic_cdx(size).sort_values('timestamp', kind='stable').reset_index(drop=True)
+    df.loc[df.index % 7 == 0, 'statuscode'] = '404'
+    df.loc[df.index % 11 == 0, 'mimetype'] = 'warc/revisit'
+    # Runs of three captures share a digest, only the first of each run surviving collapse=digest
+    df['digest'] = (df.index // 3).astype(str)
+
+    return df
+
+
+class CdxHandler(StubHandler):
+    """ Serves CDX JSON pages like web.archive.org: filter, collapse=digest, from/to and resume keys. """
+
+    index = None
+    queries = []
+
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        self.queries.append(query)
+
+        rows = self.index
+        for cdx_filter in query.get('filter', []):
+            field, value = cdx_filter.split(':', 1)
+            rows = rows[rows[field] == value]
+        if query.get('collapse') == ['digest']:
+            rows = rows[rows['digest'] != rows['digest'].shift()]
+        if 'from' in query:
+            rows = rows[rows['timestamp'].str[:8] >= query['from'][0]]
+        if 'to' in query:
+            rows = rows[rows['timestamp'].str[:8] <= query['to'][0]]
+
+        fields = query['fl'][0].split(',')
+        start = int(query.get('resumeKey', ['0'])[0])
+        limit = int(query['limit'][0])
+        page = [fields] + rows[fields].iloc[start:start + limit].values.tolist()
+        if start + limit < len(rows):
+            page += [[], [str(start + limit)]]
+
+        body = ('[' + ',\n'.join(json.dumps(row) for row in page) + ']').encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def expected_rows(index):
+    """ Captures left by the server-side filters and collapse, before the per-day selection. """
+
+    rows = index[(index['statuscode'] == '200') & (index['mimetype'] == 'text/html')]
+
+    return rows[rows['digest'] != rows['digest'].shift()]
+
+
+def expected_urls(index):
+    """ Longest capture of each day among the successful HTML ones left by collapse=digest. """
+
+    rows = expected_rows(index).copy()
+    rows['length'] = rows['length'].astype(int)
+    rows['day'] = rows['timestamp'].str[:8]
+    # First capture of the day on ties, as get_archive_urls keeps
+    rows = rows.sort_values(['day', 'length'], ascending=[True, False], kind='stable').drop_duplicates('day')
+
+    return rows[las.CDX_FIELDS].reset_index(drop=True)
+
+
+def check_iter_cdx_rows():
+    """ Rows, the empty separator and the resume key are yielded in order, empty bodies yield nothing. """
+
+    content = b'[["timestamp","original","length"],\n["20200101000000","http://a/","12"],\n[],\n["42"]]'
+    assert list(las.iter_cdx_rows(content)) == [['timestamp', 'original', 'length'], ['20200101000000', 'http://a/', '12'], [], ['42']]
+    assert list(las.iter_cdx_rows(b'[]')) == []
+    assert list(las.iter_cdx_rows(b'')) == []
+
+
+def check_get_archive_urls(index):
+    """ All pages are requested with the filters and collapse, and the days kept match the reference. """
+
+    df = las.get_archive_urls(las.TARGETS[0]['url'])
+    expected = expected_urls(index)
+    pages = -(-len(expected_rows(index)) // PAGE_SIZE)
+
+    queries = CdxHandler.queries
+    assert len(queries) == pages, (len(queries), pages)
+    assert 'resumeKey' not in queries[0]
+    assert [query['resumeKey'][0] for query in queries[1:]] == [str(PAGE_SIZE * i) for i in range(1, pages)]
+    for query in queries:
+        assert sorted(query['filter']) == sorted(las.CDX_FILTERS), query['filter']
+        assert query['collapse'] == [las.CDX_COLLAPSE] == ['digest']
+        assert query['limit'] == [str(PAGE_SIZE)]
+
+    df = df.sort_values('timestamp').reset_index(drop=True)
+    pandas.testing.assert_frame_equal(df, expected.sort_values('timestamp').reset_index(drop=True), check_dtype=False)
+
+    return len(queries), len(df)
+
+
+def main():
+    index = build_index(NUM_CAPTURES)
+    CdxHandler.index = index
+
+    server = start_stub_server()
+    server.RequestHandlerClass = CdxHandler
+    host, port = server.server_address
+
+    las.CDX_ENDPOINT = f'http://{host}:{port}/cdx/search/cdx'
+    las.CDX_PAGE_SIZE = PAGE_SIZE
+    # A fresh cache so that every page goes to the stub server
+    http_cache._cache = http_cache.HttpCache(tempfile.mkdtemp())
+
+    check_iter_cdx_rows()
+    print('iter_cdx_rows: ok')
+
+    requests, days = check_get_archive_urls(index)
+    print(f'get_archive_urls: ok, {requests} pages, {days} days kept out of {len(index)} captures')
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
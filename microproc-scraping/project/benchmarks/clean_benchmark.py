@@ -0,0 +1,155 @@
+import json
+import pathlib
+import time
+
+import numpy
+import pandas
+import project.sample.tpu_scraper as tpu
+
+NUM_ROWS = 1_000_000
+
+
+def clean_dataset_rowwise(df, target):
+    """ Former row-wise implementation of tpu_scraper.clean_dataset. """
+
+    if target == 'cpu':
+        df = df[['model', 'Process Size', 'Transistors', 'Die Size', 'Launch Price', 'Release Date', '# of Cores', '# of Threads', 'Frequency', 'TDP', 'Foundry']]
+        
+        df['Process Size'] = df['Process Size'].apply(lambda x: int(x.replace(' nm', '')) if isinstance(x, str) else x)
+        df['Transistors'] = df['Transistors'].apply(lambda x: int(x.replace(' million', '').replace(',', '')) if isinstance(x, str) else x)
+        df['Die Size'] = df['Die Size'].apply(lambda x: x.replace(' mm²', '') if isinstance(x, str) else x)
+        df['Die Size'] = df['Die Size'].apply(lambda x: int(x.split('x')[0]) * int(x.split('x')[1]) if isinstance(x, str) and 'x' in x else x)
+        df['Launch Price'] = df['Launch Price'].apply(lambda x: int(x.replace('$', '')) if isinstance(x, str) else x)
+        df['Release Date'] = df['Release Date'].apply(lambda x: tpu.to_isodate(x) if isinstance(x, str) else x)
+        df['Frequency'] = df['Frequency'].apply(lambda x: float(x.replace(' GHz', '')) if isinstance(x, str) and 'GHz' in x else (float(x.replace(' MHz', '')) / 1000 if isinstance(x, str) and 'MHz' in x else x))
+        df['TDP'] = df['TDP'].apply(lambda x: int(x.replace(' W', '')) if isinstance(x, str) else x)
+        df['Foundry'] = df['Foundry'].apply(lambda x: x.upper() if isinstance(x, str) else x)
+
+        df = df.replace(['nan', 'NaN', numpy.nan], [None, None, None])
+
+        df['Process Size'] = df['Process Size'].astype('str')
+        df['Transistors'] = df['Transistors'].astype('str')
+        df['Die Size'] = df['Die Size'].astype('str')
+        df['Launch Price'] = df['Launch Price'].astype('str')
+        df['Release Date'] = df['Release Date'].astype('str')
+        df['Frequency'] = df['Frequency'].astype('str')
+        df['TDP'] = df['TDP'].astype('str')
+        df['Foundry'] = df['Foundry'].astype('str')
+
+        df = df.rename(columns={
+            'model': 'model',
+            'Process Size': 'process_size_nm',
+            'Transistors': 'transistor_count',
+            'Die Size': 'die_size_mm2',
+            'Launch Price': 'launch_price_usd',
+            'Release Date': 'release_date',
+            '# of Cores': 'core_count',
+            '# of Threads': 'thread_count',
+            'Frequency': 'frequency_ghz',
+            'TDP': 'tdp_w',
+            'Foundry': 'foundry'
+        })
+    
+    elif target == 'gpu':
+        df = df[['model', 'Architecture', 'Process Size', 'Transistors', 'Density', 'Die Size', 'TDP', 'Memory Size', 'Memory Type', 'Launch Price', 'Release Date', 'Tensor Cores', 'Pixel Rate', 'Texture Rate', 'FP32 (float)', 'Base Clock', 'Boost Clock', 'Foundry']]
+    
+        df['Architecture'] = df['Architecture'].apply(lambda x: x.upper() if isinstance(x, str) else None)
+        df['Process Size'] = df['Process Size'].apply(lambda x: int(x.replace(' nm', '')) if isinstance(x, str) else numpy.nan)
+        df['Transistors'] = df['Transistors'].apply(lambda x: int(x.replace(' million', '').replace(',', '')) if isinstance(x, str) else numpy.nan)
+        df['Density'] = df['Density'].apply(lambda x: float(x.replace('M / mm²', '')) if isinstance(x, str) and 'M / mm²' in x else (float(x.replace('K / mm²', '')) / 1000 if isinstance(x, str) and 'K / mm²' in x else numpy.nan))
+        df['Die Size'] = df['Die Size'].apply(lambda x: int(x.replace(' mm²', '')) if isinstance(x, str) else numpy.nan)
+        df['TDP'] = df['TDP'].apply(lambda x: x.replace(' W', '').replace('unknown', '') if isinstance(x, str) else x)
+        df['Memory Size'] = df['Memory Size'].apply(lambda x: float(x.replace(' GB', '')) if isinstance(x, str) and 'GB' in x else (float(x.replace(' MB', '')) / 1024 if isinstance(x, str) and 'MB' in x else numpy.nan))
+        df['Launch Price'] = df['Launch Price'].apply(lambda x: int(x.replace(' USD', '').replace(',', '')) if isinstance(x, str) else numpy.nan)
+        df['Release Date'] = df['Release Date'].apply(lambda x: numpy.nan if x == 'Never Released' else (tpu.to_isodate(x) if isinstance(x, str) else x))
+        df['Pixel Rate'] = df['Pixel Rate'].apply(lambda x: float(x.replace(' GPixel/s', '')) if isinstance(x, str) else numpy.nan)
+        df['Texture Rate'] = df['Texture Rate'].apply(lambda x: float(x.replace(' GTexel/s', '').replace(',', '')) if isinstance(x, str) and 'GTexel/s' in x else (float(x.replace(' MTexel/s', '').replace(',', '')) / 1000 if isinstance(x, str) and 'MTexel/s' in x else numpy.nan))
+        df['FP32 (float)'] = df['FP32 (float)'].apply(lambda x: float(x.replace(' TFLOPS', '').replace(',', '')) if isinstance(x, str) and 'TFLOPS' in x else (float(x.replace(' GFLOPS', '').replace(',', '')) / 1000 if isinstance(x, str) and 'GFLOPS' in x else numpy.nan))
+        df['Base Clock'] = df['Base Clock'].apply(lambda x: int(x.replace(' MHz', '')) if isinstance(x, str) else numpy.nan)
+        df['Boost Clock'] = df['Boost Clock'].apply(lambda x: int(x.replace(' MHz', '')) if isinstance(x, str) else numpy.nan)
+        df['Foundry'] = df['Foundry'].apply(lambda x: x.upper() if isinstance(x, str) else None)
+
+        df[['Architecture', 'Release Date', 'Foundry', 'Memory Type']] = df[['Architecture', 'Release Date', 'Foundry', 'Memory Type']].replace(['nan', 'NaN', numpy.nan], None)
+        df[['Architecture', 'Release Date', 'Foundry', 'Memory Type']] = df[['Architecture', 'Release Date', 'Foundry', 'Memory Type']].astype('str')
+
+        df[['Process Size', 'Transistors', 'Die Size', 'TDP', 'Launch Price', 'Base Clock', 'Boost Clock']] = df[['Process Size', 'Transistors', 'Die Size', 'TDP', 'Launch Price', 'Base Clock', 'Boost Clock']].replace(['', 'nan', 'NaN'], numpy.nan)
+        df[['Process Size', 'Transistors', 'Die Size', 'TDP', 'Launch Price', 'Base Clock', 'Boost Clock']] = df[['Process Size', 'Transistors', 'Die Size', 'TDP', 'Launch Price', 'Base Clock', 'Boost Clock']].astype('Int64')
+
+        df[['Density', 'Memory Size', 'Pixel Rate', 'Texture Rate', 'FP32 (float)']] = df[['Density', 'Memory Size', 'Pixel Rate', 'Texture Rate', 'FP32 (float)']].astype('Float64')
+        df[['Density', 'Memory Size', 'Pixel Rate', 'Texture Rate', 'FP32 (float)']] = df[['Density', 'Memory Size', 'Pixel Rate', 'Texture Rate', 'FP32 (float)']].replace(['', 'nan', 'NaN'], numpy.nan)
+
+        df = df.rename(columns={
+            'model': 'model',
+            'Architecture': 'architecture',
+            'Process Size': 'process_size_nm',
+            'Transistors': 'transistor_count',
+            'Density': 'density_m_per_mm2',
+            'Die Size': 'die_size_mm2',
+            'TDP': 'tdp_w',
+            'Memory Size': 'memory_size_gb',
+            'Memory Type': 'memory_type',
+            'Launch Price': 'launch_price_usd',
+            'Release Date': 'release_date',
+            'Tensor Cores': 'tensor_core_count',
+            'Pixel Rate': 'pixel_rate_gpixel_per_s',
+            'Texture Rate': 'texture_rate_gtexel_per_s',
+            'FP32 (float)': 'fp32_tflops',
+            'Base Clock': 'base_clock_mhz',
+            'Boost Clock': 'boost_clock_mhz',
+            'Foundry': 'foundry'
+        })
+
+    return df
+
+
+def normalize(value):
+    """ Returns the value as loaded into the database, for comparison purposes. """
+
+    if value is None or value is pandas.NA or value == 'None' or value == '' or (not isinstance(value, str) and pandas.isna(value)):
+        return None
+    if isinstance(value, pandas.Timestamp):
+        return value.date().isoformat()
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def compare(rowwise, vectorized):
+    """ Counts the cells whose loaded value differs between both implementations. """
+
+    rowwise = rowwise.reset_index(drop=True)
+    vectorized = vectorized.reset_index(drop=True)
+    mismatches = 0
+
+    for column in rowwise.columns:
+        left = rowwise[column].astype(object).map(normalize)
+        right = vectorized[column].astype(object).map(normalize)
+        mismatches += int((left.fillna('<NULL>') != right.fillna('<NULL>')).sum())
+
+    return mismatches
+
+
+def main():
+    for target in tpu.TARGETS:
+        with open(pathlib.Path(tpu.DATA_DIR, f'{target}_whole_specs.json'), 'r', encoding='utf8') as file:
+            data = json.load(file)
+
+        df = pandas.DataFrame(data)
+        print(f"{target}: {compare(clean_dataset_rowwise(df.copy(), target), tpu.clean_dataset(df, target))} mismatching cells on the scraped dataset")
+
+        synthetic = df.sample(n=NUM_ROWS, replace=True, random_state=0).reset_index(drop=True)
+
+        start = time.perf_counter()
+        clean_dataset_rowwise(synthetic.copy(), target)
+        rowwise = time.perf_counter() - start
+
+        start = time.perf_counter()
+        tpu.clean_dataset(synthetic, target)
+        vectorized = time.perf_counter() - start
+
+        print(f"{target}: {NUM_ROWS} rows, row-wise {rowwise:.2f} s, vectorized {vectorized:.2f} s, x{rowwise / vectorized:.1f}")
+
+
+if __name__ == '__main__':
+    main()
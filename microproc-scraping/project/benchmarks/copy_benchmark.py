@@ -0,0 +1,73 @@
+import pathlib
+import time
+
+import pandas
+import project.sample.db_conn as dbc
+
+EXPORTS_DIR = pathlib.Path(dbc.DATA_DIR, 'pg_exports')
+TARGETS = ['cpu', 'gpu']
+
+# The exported datasets are replicated with suffixed models to get a more telling volume
+SCALE = 20
+
+
+def load_dataset(target):
+    """ Loads an exported specs dataset, without its id column, scaled up SCALE times. """
+
+    df = pandas.read_csv(pathlib.Path(EXPORTS_DIR, f'{target}_specs_dataset.csv'), dtype=str)
+    df = df.drop(columns=['id'])
+
+    frames = []
+    for i in range(SCALE):
+        frame = df.copy()
+        frame['model'] = frame['model'] + f' #{i}'
+        frames.append(frame)
+
+    return pandas.concat(frames, ignore_index=True)
+
+
+def bench_row_by_row(conn, df, target):
+    """ Former push_df_to_db path: one INSERT per row. """
+
+    start = time.perf_counter()
+
+    data = df.to_dict(orient="records")
+    data = [{k: None if pandas.isna(v) or v == 'None' or v == '' else v for k, v in d.items()} for d in data]
+
+    for row_dict in data:
+        if target == 'cpu':
+            dbc.add_data_to_cpu_specs_tb(conn, row_dict)
+        elif target == 'gpu':
+            dbc.add_data_to_gpu_specs_tb(conn, row_dict)
+
+    return time.perf_counter() - start
+
+
+def bench_copy(conn, df, target):
+    """ New push_df_to_db path: one COPY staged and upserted. """
+
+    start = time.perf_counter()
+    dbc.copy_upsert(conn, df, f'{target}_specs', ('model',))
+
+    return time.perf_counter() - start
+
+
+def main():
+    dbc.create_specs_tables()
+
+    for target in TARGETS:
+        df = load_dataset(target)
+
+        for name, bench in (('row by row', bench_row_by_row), ('COPY', bench_copy)):
+            # Each run starts from an empty table and is rolled back, leaving the database untouched
+            with dbc.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(f"DELETE FROM {target}_specs;")
+                elapsed = bench(conn, df, target)
+                conn.rollback()
+
+            print(f"{target}_specs {name:<12} {len(df):>7} rows  {elapsed:8.3f} s  {len(df) / elapsed:10.0f} rows/s")
+
+
+if __name__ == '__main__':
+    main()
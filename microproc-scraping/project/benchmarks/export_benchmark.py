@@ -0,0 +1,115 @@
+import csv
+import json
+import multiprocessing
+import pathlib
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import project.sample.db_conn as dbc
+
+# Rows of the synthetic prices table, the legacy export being run on the smallest sizes only
+SIZES = [20_000, 100_000, 500_000]
+LEGACY_MAX_SIZE = 100_000
+TABLE = 'export_benchmark'
+
+
+def create_table(size, table=TABLE):
+    """ Fills a throwaway table shaped like products with size rows, generated server-side. """
+
+    with dbc.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {table};")
+            cur.execute(f"""
+                CREATE TABLE {table} AS
+                SELECT
+                    i AS id,
+                    DATE '2010-01-01' + (i %% 5000) AS date,
+                    'AR' || LPAD(i::text, 12, '0') AS sku,
+                    CASE WHEN i %% 2 = 0 THEN 'CPU' ELSE 'GPU' END AS category,
+                    'Processeur ' || i || ' cœurs' AS title,
+                    'Socket AM4 - ' || (i %% 16) || ' coeurs - Cache 32 Mo' AS description,
+                    'MODEL-' || (i %% 997) AS model,
+                    ROUND((50 + (i %% 2000) * 0.37)::numeric, 2) AS price
+                FROM generate_series(1, %s) AS i;
+            """, (size,))
+
+
+def drop_table(table=TABLE):
+    with dbc.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {table};")
+
+
+def export_legacy(directory):
+    """ Former export_table: fetchall, then a second list of dicts for json.dump. """
+
+    with dbc.connection() as db_conn:
+        with db_conn.cursor() as cur:
+            cur.execute(f"SELECT * FROM {TABLE}")
+            rows = cur.fetchall()
+
+        with open(pathlib.Path(directory, f'{TABLE}_dataset.csv'), 'w', newline='', encoding='utf-8') as csvfile:
+            csvwriter = csv.writer(csvfile)
+            csvwriter.writerow([desc[0] for desc in cur.description])
+            csvwriter.writerows(rows)
+
+        with open(pathlib.Path(directory, f'{TABLE}_dataset.json'), 'w', encoding='utf-8') as jsonfile:
+            column_names = [desc[0] for desc in cur.description]
+            data = [dict(zip(column_names, row)) for row in rows]
+            json.dump(data, jsonfile, cls=dbc.CustomEncoder, ensure_ascii=False)
+
+
+def export_streaming(directory, **options):
+    dbc.EXPORT_DIR = pathlib.Path(directory)
+    dbc.export_table(TABLE, formats=('csv', 'json'), **options)
+
+
+def peak_rss():
+    """ Returns the peak resident size of the process in MiB. Unlike ru_maxrss, VmHWM is not
+    inherited from the parent process, which runs the legacy export for the comparison. """
+
+    for line in pathlib.Path('/proc/self/status').read_text().splitlines():
+        if line.startswith('VmHWM:'):
+            return int(line.split()[1]) / 1024
+
+
+def measure(export, *args, **options):
+    """ Runs an export in a fresh process, returning its duration in seconds and the peak resident
+    size of the process in MiB. The resident size is measured rather than tracemalloc, psycopg2
+    keeping fetched rows in libpq buffers until they are iterated. """
+
+    start = time.perf_counter()
+    export(*args, **options)
+    elapsed = time.perf_counter() - start
+
+    return elapsed, peak_rss()
+
+
+def main():
+    try:
+        for size in SIZES:
+            create_table(size)
+
+            with tempfile.TemporaryDirectory() as directory:
+                runs = [('streaming', export_streaming, {}), ('streaming jsonl.gz', export_streaming, {'json_lines': True, 'compress': True})]
+                if size <= LEGACY_MAX_SIZE:
+                    runs.insert(0, ('legacy', export_legacy, {}))
+
+                for name, export, options in runs:
+                    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                        elapsed, peak = executor.submit(measure, export, directory, **options).result()
+                    print(f"{size:>8} rows  {name:<20} {elapsed:7.2f} s  peak RSS {peak:8.1f} MiB")
+
+                if size <= LEGACY_MAX_SIZE:
+                    # The streaming JSON array replaced the legacy file, rewrite it to compare
+                    export_legacy(directory)
+                    legacy = pathlib.Path(directory, f'{TABLE}_dataset.json').read_bytes()
+                    export_streaming(directory)
+                    print(f"{'':>8}       identical JSON: {legacy == pathlib.Path(directory, f'{TABLE}_dataset.json').read_bytes()}")
+    finally:
+        drop_table()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import decimal
+import pathlib
+import tempfile
+
+import project.sample.db_conn as dbc
+from project.benchmarks.export_benchmark import create_table, drop_table
+
+TABLE = 'export_check'
+NUM_ROWS = 1000
+# More decimal places than NUMERIC_SCALE, as the float artefacts of gpu_specs.fp32_tflops
+LONG_DECIMAL = '0.43210000000000004'
+
+
+def add_long_decimals(table, offset=0):
+    """ Adds a tflops column with values of 17 decimal places, and NUM_ROWS more rows when offset is given. """
+
+    with dbc.connection() as conn:
+        with conn.cursor() as cur:
+            if offset:
+                cur.execute(f"""
+                    INSERT INTO {table}
+                    SELECT id + %s, date, sku, category, title, description, model, price + 0.123456789012345, tflops + 1
+                    FROM {table} WHERE id <= %s;
+                """, (offset, NUM_ROWS))
+            else:
+                cur.execute(f"ALTER TABLE {table} ADD COLUMN tflops numeric;")
+                cur.execute(f"UPDATE {table} SET tflops = %s::numeric + id;", (LONG_DECIMAL,))
+
+
+def check_parquet(table):
+    """ Every decimal read back from the dataset is the database value rounded to NUMERIC_SCALE. """
+
+    quantum = decimal.Decimal(1).scaleb(-dbc.NUMERIC_SCALE)
+    with dbc.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT id, price, tflops FROM {table} ORDER BY id;")
+            expected = [(id, price.quantize(quantum), tflops.quantize(quantum)) for id, price, tflops in cur.fetchall()]
+
+    dataset = dbc.read_parquet_dataset(pathlib.Path(dbc.EXPORT_DIR, f'{table}_dataset')).to_table(columns=['id', 'price', 'tflops'])
+    rows = sorted(zip(*(dataset.column(name).to_pylist() for name in ('id', 'price', 'tflops'))))
+    assert rows == expected, (rows[:3], expected[:3])
+
+    return len(rows)
+
+
+def main():
+    dbc.EXPORT_DIR = pathlib.Path(tempfile.mkdtemp())
+    # The check table gets delta files as the price tables do
+    dbc.APPEND_ONLY_TABLES = (TABLE,)
+
+    create_table(NUM_ROWS, TABLE)
+    try:
+        add_long_decimals(TABLE)
+        dbc.export_tables((TABLE,), formats=('parquet',), incremental=True)
+        print(f'full export: ok, {check_parquet(TABLE)} rows')
+
+        add_long_decimals(TABLE, offset=NUM_ROWS)
+        dbc.export_tables((TABLE,), formats=('parquet',), incremental=True)
+        print(f'delta export: ok, {check_parquet(TABLE)} rows')
+
+        dbc.compact_exports((TABLE,))
+        print(f'compaction: ok, {check_parquet(TABLE)} rows')
+    finally:
+        drop_table(TABLE)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from project.sample.async_fetcher import AsyncFetcher
+
+NUM_REQUESTS = 500
+LATENCY = 0.05
+PAGE = b'<html><body><ul class="pagination"><li>1</li></ul>' + b'<li class="pdt-item" data-id="PB00000000001"></li>' * 40 + b'</body></html>'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """ Serves the same listing page after a fixed delay, imitating web.archive.org latency. """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        time.sleep(LATENCY)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 would drop most concurrent connections
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+def start_stub_server():
+    """ Starts the stub HTTP server in a background thread. """
+
+    server = StubServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+def bench_blocking(urls):
+    """ One blocking requests.get per page, as get_soup does. """
+
+    start = time.perf_counter()
+    for url in urls:
+        requests.get(url)
+
+    return time.perf_counter() - start
+
+
+def bench_async(urls, host_limit):
+    """ All pages through one AsyncFetcher. """
+
+    async def run():
+        async with AsyncFetcher(default_host_limit=host_limit) as fetcher:
+            await fetcher.fetch_all(urls)
+
+    start = time.perf_counter()
+    asyncio.run(run())
+
+    return time.perf_counter() - start
+
+
+def main():
+    server = start_stub_server()
+    host, port = server.server_address
+    urls = [f'http://{host}:{port}/web/2019{i:010d}/page' for i in range(NUM_REQUESTS)]
+
+    # The blocking baseline is run on a sample only, its cost being linear
+    sample = urls[:NUM_REQUESTS // 10]
+    blocking = bench_blocking(sample) * (len(urls) / len(sample))
+    print(f"{'blocking requests.get (extrapolated)':<40} {blocking:8.2f} s  {len(urls) / blocking:8.1f} req/s")
+
+    for host_limit in (10, 50, 200):
+        elapsed = bench_async(urls, host_limit)
+        print(f"{f'AsyncFetcher, {host_limit} per host':<40} {elapsed:8.2f} s  {len(urls) / elapsed:8.1f} req/s")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import os
+import pathlib
+import tempfile
+import time
+
+import project.sample.db_conn as dbc
+from project.benchmarks.export_benchmark import create_table, drop_table
+
+# Throwaway tables standing for the two prices tables and the two much smaller specs tables
+TABLES = {
+    'export_benchmark_gpu_prices': 60_000,
+    'export_benchmark_cpu_prices': 40_000,
+    'export_benchmark_gpu_specs': 300,
+    'export_benchmark_cpu_specs': 300,
+}
+
+
+def export_sequential(tables):
+    """ Former __main__: one export_table call after another. """
+
+    for table in tables:
+        dbc.export_table(table)
+
+
+def main():
+    for table, size in TABLES.items():
+        create_table(size, table)
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            # Spawned workers read the directory from the environment
+            os.environ['ELECTRONICS_EXPORT_DIR'] = directory
+            dbc.EXPORT_DIR = pathlib.Path(directory)
+
+            start = time.perf_counter()
+            export_sequential(TABLES)
+            sequential = time.perf_counter() - start
+
+            start = time.perf_counter()
+            dbc.export_tables(tuple(TABLES))
+            parallel = time.perf_counter() - start
+
+        print(f"sequential export_table {sequential:7.2f} s")
+        print(f"export_tables           {parallel:7.2f} s  x{sequential / parallel:4.1f}  ({dbc.EXPORT_WORKERS} workers)")
+    finally:
+        for table in TABLES:
+            drop_table(table)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import pathlib
+import tempfile
+import time
+
+import pandas
+import pyarrow.dataset
+import project.sample.db_conn as dbc
+from project.benchmarks.export_benchmark import TABLE, create_table, drop_table
+
+# About the size of cpu_prices and gpu_prices together
+SIZE = 100_000
+REPEATS = 5
+
+
+def size_mb(path):
+    """ Returns the size of a file, or of all files under a directory, in MiB. """
+
+    path = pathlib.Path(path)
+    files = path.rglob('*') if path.is_dir() else [path]
+
+    return sum(file.stat().st_size for file in files if file.is_file()) / 1024 ** 2
+
+
+def best_time(load):
+    """ Returns the best duration of REPEATS loads, and the loaded frame. """
+
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        df = load()
+        timings.append(time.perf_counter() - start)
+
+    return min(timings), df
+
+
+def main():
+    create_table(SIZE)
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            dbc.EXPORT_DIR = pathlib.Path(directory)
+            paths = dbc.export_table(TABLE, formats=('csv', 'json', 'parquet'))
+
+            loads = [
+                ('CSV', paths['csv'], lambda: pandas.read_csv(paths['csv'])),
+                ('JSON', paths['json'], lambda: pandas.read_json(paths['json'])),
+                # Most of the pandas load goes to building Decimal and date objects from the Arrow columns
+                ('Parquet', paths['parquet'], lambda: pandas.read_parquet(paths['parquet'])),
+                ('Parquet (Arrow)', paths['parquet'], lambda: pyarrow.dataset.dataset(paths['parquet'], partitioning='hive').to_table()),
+                # A single category and year is read from its partition only
+                ('Parquet CPU 2015', paths['parquet'], lambda: pandas.read_parquet(paths['parquet'], filters=[('category', '=', 'CPU'), ('year', '=', 2015)])),
+            ]
+
+            for name, path, load in loads:
+                elapsed, df = best_time(load)
+                print(f"{name:<18} {size_mb(path):7.2f} MiB  load {elapsed * 1000:8.1f} ms  {len(df):>7} rows")
+    finally:
+        drop_table()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+import pathlib
+import re
+import sys
+import time
+
+from bs4 import BeautifulSoup
+import project.sample.ldlc_archive_scraper as las
+
+NUM_ARTICLES = 48
+# Unrelated markup (menus, footers, scripts) surrounding the listing in real pages
+NUM_FILLER_LINKS = 1500
+REPEAT = 20
+
+# Post-2019-02 articles priced inline in their basket, one in INLINE_PRICE_EVERY, the others through the scripts
+INLINE_PRICE_EVERY = 3
+
+# Dates on both sides of the layout update distinguished by is_before_update
+OLD_LAYOUT_DATE = '2018-10-23'
+NEW_LAYOUT_DATE = '2019-05-30'
+
+
+class LegacyProduct(las.Product):
+    """ Former extractors, running every selector from its string, once in the test and again in the body. """
+
+    def get_sku(self, html):
+        if html.select_one('td[class="designation"] > a[class="seemore"]'):
+            sku_info = html.select_one('td[class="designation"] > a[class="seemore"]').get('href')
+            sku = re.search(r'(\D{2}\d{12}?)', sku_info).group(1)
+        else:
+            sku = html['data-id']
+
+        return sku
+
+    def get_title(self, html):
+        if html.select_one('td[class="designation"] > a') is not None:
+            title = html.select_one('td[class="designation"] > a').get_text(strip=True)
+        elif html.select_one('div[class="pdt-info"] > h3[class="title-3"] > a') is not None:
+            title = html.select_one('div[class="pdt-info"] > h3[class="title-3"] > a').get_text(strip=True)
+        elif html.select_one('div[class="dsp-cell-right"] > div > div > h3[class="title-3"]') is not None:
+            title = html.select_one('div[class="dsp-cell-right"] > div > div > h3[class="title-3"]').get_text(strip=True)
+
+        return title[:120]
+
+    def get_info(self, html):
+        if html.select_one('td[class="designation"] > span') is not None:
+            html_info = html.select_one('td[class="designation"] > span').get_text(strip=True)
+        elif html.select_one('td[class="designation"] > div[class="caract"] > span') is not None:
+            html_info = html.select_one('td[class="designation"] > div[class="caract"] > span').get_text(strip=True)
+        if html.select_one('div[class="pdt-info"] > h3[class="title-3"] > a') is not None:
+            html_info = html.select_one('div[class="pdt-info"] > p[class="desc"]').get_text(strip=True)
+        elif html.select_one('div[class="dsp-cell-right"] > div > div > h3[class="title-3"]') is not None:
+            html_info = html.select_one('div[class="dsp-cell-right"] > div > div > p[class="desc"]').get_text(strip=True)
+
+        desc = re.sub(r'\([^()]*\)', '', html_info).strip()
+        try:
+            model = re.search(r'\(([^()]+)\)', html_info).group(1)
+        except AttributeError:
+            model = ''
+
+        return desc[:140], model
+
+    def get_price(self, html, page_prices):
+        if las.is_before_update(self.date):
+            if html.select_one('td[class="prix"] > span[class="price"]') is not None:
+                price_info = html.select_one('td[class="prix"] > span[class="price"]').prettify().split('<sup>')
+                price = las.price_from_string(price_info)
+            else:
+                price = None
+        else:
+            if html.select_one('div[class="basket"] > div[class="price"] > div[class="price"]') is not None:
+                price_info = html.select_one('div[class="basket"] > div[class="price"] > div[class="price"]').prettify().split('<sup>')
+                price = las.price_from_string(price_info)
+            else:
+                price = page_prices.get(html.get('data-id'))
+
+        return price
+
+
+def legacy_page_articles(soup):
+    """ Former get_page_articles, running the matching selector twice. """
+
+    if soup.select('tr[class*="cmp"]:not([class*="group"])'):
+        articles = soup.select('tr[class*="cmp"]:not([class*="group"])')
+    elif soup.select('li[class="pdt-item"]'):
+        articles = soup.select('li[class="pdt-item"]')
+    return articles
+
+
+def filler():
+    """ Builds the navigation and footer markup found around the listing. """
+
+    links = ''.join(f'<li class="menu-item"><a href="/rayon/{i}/">Rayon {i}</a><span class="count">{i}</span></li>' for i in range(NUM_FILLER_LINKS))
+    script = '<script>' + 'var tracking = {"page": "listing", "items": [1, 2, 3]};\n' * 200 + '</script>'
+
+    return f'<div id="header"><ul class="menu">{links}</ul></div>{script}'
+
+
+def synthetic_old_page():
+    """ Builds a pre-2019-02 listing page: articles are table rows, prices inline. """
+
+    rows = ''.join(
+        f'<tr class="cmp{" group" if i % 12 == 0 else ""} e{i % 2}">'
+        f'<td class="designation"><a href="https://www.ldlc.com/fiche/PB{500000000000 + i}.html">Processeur {i}</a>'
+        f'<span>Processeur {i} coeurs 3.{i % 10} GHz (Model-{i})</span>'
+        f'<a class="seemore" href="https://www.ldlc.com/fiche/PB{500000000000 + i}.html">Voir</a></td>'
+        f'<td class="prix"><span class="price">{100 + i}<sup>&euro;{i % 100:02d}</sup></span></td></tr>'
+        for i in range(NUM_ARTICLES)
+    )
+    pager = ''.join(f'<li><a href="/web/20181023002455/page{p}/">{p}</a></li>' for p in range(1, 5))
+
+    return f'<html><body>{filler()}<table class="productList">{rows}</table><ul class="pagerItems">{pager}</ul>{filler()}</body></html>'.encode()
+
+
+# Basket of the articles priced through the scripts, the price being added by them
+EMPTY_PRICE = '<div class="price"></div>'
+
+
+def new_price(i):
+    """ Returns the price markup of the i-th post-2019-02 article, thousands separated by a non-breaking space. """
+
+    return f'<div class="price"><div class="price">{1 + i // 10}&nbsp;{i:03d}<sup>&euro;{i % 100:02d}</sup></div></div>'
+
+
+def synthetic_new_page():
+    """ Builds a post-2019-02 listing page: articles are list items, prices inline in the basket
+    for one in INLINE_PRICE_EVERY, in the script section for the others. """
+
+    ids = [f'AR{201900000000 + i}' for i in range(NUM_ARTICLES)]
+    items = ''.join(
+        f'<li class="pdt-item" data-id="{id}"><div class="dsp-cell-right"><div class="pdt-info">'
+        f'<h3 class="title-3"><a href="/fiche/{id}.html">Carte graphique {i}</a></h3>'
+        f'<p class="desc">Carte graphique {i} Go GDDR6 (Model-{i})</p></div>'
+        f'<div class="basket">{new_price(i) if i % INLINE_PRICE_EVERY == 0 else EMPTY_PRICE}</div></div></li>'
+        for i, id in enumerate(ids)
+    )
+    scripts = '\n'.join(
+        f"""$("#pdt-{id} .price").replaceWith('{new_price(i)}');"""
+        for i, id in enumerate(ids) if i % INLINE_PRICE_EVERY != 0
+    )
+    pager = ''.join(f'<li><a href="/web/20190530000000/page{p}/">{p}</a></li>' for p in range(1, 5))
+
+    return f'<html><body>{filler()}<ul class="listing">{items}</ul><ul class="pagination">{pager}</ul>{filler()}<script>\n{scripts}\n</script></body></html>'.encode()
+
+
+def load_corpus():
+    """ Loads saved archive pages from the directory given as argument, or one synthetic page per layout.
+    Saved pages are dated from the wayback timestamp starting their file name, e.g. 20181023002455.html. """
+
+    if len(sys.argv) > 1:
+        corpus = []
+        for path in sorted(pathlib.Path(sys.argv[1]).glob('*.html')):
+            timestamp = re.match(r'\d{8}', path.name)
+            if timestamp is None:
+                continue
+            corpus.append((las.get_iso_date(timestamp.group(0)), path.read_bytes()))
+        return corpus
+
+    return [(OLD_LAYOUT_DATE, synthetic_old_page()), (NEW_LAYOUT_DATE, synthetic_new_page())]
+
+
+def extract(soup, row, page_prices, product_class, page_articles):
+    """ Extracts the products and the pagination from a parsed page. """
+
+    products = [product_class(article, row, page_prices).to_dict() for article in page_articles(soup)]
+    pagination, num_pages = las.get_page_navigation(soup)
+
+    return products, [li.find('a').get('href') for li in pagination or []]
+
+
+def bench(corpus, parser, strain, product_class, page_articles):
+    """ Parses and extracts every page REPEAT times, returning both timings per page and the last results. """
+
+    parse_time = extract_time = 0
+    results = []
+
+    for date, content in corpus:
+        row = {'category': 'CPU', 'date': date}
+        page_prices = las.extract_page_prices(content)
+
+        start = time.perf_counter()
+        for _ in range(REPEAT):
+            soup = las.make_soup(content, parser=parser, strain=strain)
+        parse_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(REPEAT):
+            result = extract(soup, row, page_prices, product_class, page_articles)
+        extract_time += time.perf_counter() - start
+
+        results.append(result)
+
+    pages = len(corpus) * REPEAT
+
+    return parse_time / pages, extract_time / pages, results
+
+
+def main():
+    corpus = load_corpus()
+    old_pages = sum(las.is_before_update(date) for date, content in corpus)
+    print(f"{len(corpus)} pages: {old_pages} pre-2019-02, {len(corpus) - old_pages} post-2019-02, {sum(len(c) for d, c in corpus) / len(corpus) / 1024:.0f} KiB on average")
+
+    configurations = [
+        ('html.parser, legacy extractors', 'html.parser', False, LegacyProduct, legacy_page_articles),
+        ('html.parser', 'html.parser', False, las.Product, las.get_page_articles),
+        ('lxml', 'lxml', False, las.Product, las.get_page_articles),
+        ('lxml + strainer', 'lxml', True, las.Product, las.get_page_articles),
+    ]
+
+    baseline = None
+    for name, parser, strain, product_class, page_articles in configurations:
+        parse_time, extract_time, results = bench(corpus, parser, strain, product_class, page_articles)
+        total = parse_time + extract_time
+
+        if baseline is None:
+            baseline, reference = total, results
+        mismatches = sum(result != expected for result, expected in zip(results, reference))
+
+        print(f"{name:<32} parse {parse_time * 1000:8.2f} ms  extract {extract_time * 1000:7.2f} ms  x{baseline / total:5.1f}  {mismatches} mismatching pages")
+
+
+if __name__ == '__main__':
+    main()
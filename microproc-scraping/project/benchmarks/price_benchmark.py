@@ -0,0 +1,99 @@
+import operator
+import pathlib
+import re
+import sys
+import time
+
+from bs4 import BeautifulSoup
+import project.sample.ldlc_archive_scraper as las
+
+NUM_ARTICLES = 48
+REPEAT = 50
+
+
+def extract_page_prices_legacy(soup):
+    """ Former implementation: several regexes over str(soup), returning a list of dictionaries. """
+
+    page_prices = []
+
+    try:
+        price_trails = re.findall(r'''\$\("#pdt-\D{2}\d{12} \.price"\)\.replaceWith\('<div class="price"><div class="price">.+<\/sup><\/div><\/div>'\);''', str(soup))
+
+        for trail in price_trails:
+            product_id = re.search(r'#pdt-(\D{2}\d{12}?)', trail).group(1)
+            price_info = re.search(r'<div class="price"><div class="price">(.+?)<\/sup>', trail).group(1).split('<sup>')
+            integral = ''.join(re.findall(r'\d+', price_info[0]))
+            fractional = ''.join(re.findall(r'\d+', price_info[1]))
+            product_price = float(integral + '.' + fractional)
+
+            page_prices.append({"product_id": product_id, "product_price": product_price})
+
+        return page_prices
+
+    except:
+        return page_prices
+
+
+def lookup_legacy(page_prices, id):
+    """ Former Product.get_price lookup of a script-embedded price. """
+
+    try:
+        index = list(map(operator.itemgetter("product_id"), page_prices)).index(id)
+        return page_prices[index]["product_price"]
+    except ValueError:
+        return None
+
+
+def synthetic_page():
+    """ Builds a post-2019-02 listing page whose prices are all in the script section. """
+
+    ids = [f'AR{201900000000 + i}' for i in range(NUM_ARTICLES)]
+    articles = ''.join(f'<li class="pdt-item" data-id="{id}"><div class="price"></div></li>' for id in ids)
+    scripts = '\n'.join(
+        f"""$("#pdt-{id} .price").replaceWith('<div class="price"><div class="price">{100 + i}<sup>&euro;{i % 100:02d}</sup></div></div>');"""
+        for i, id in enumerate(ids)
+    )
+
+    return f'<html><body><ul class="listing">{articles}</ul><script>\n{scripts}\n</script></body></html>'.encode()
+
+
+def load_corpus():
+    """ Loads saved archive pages from the directory given as argument, or a synthetic page. """
+
+    if len(sys.argv) > 1:
+        return [path.read_bytes() for path in sorted(pathlib.Path(sys.argv[1]).glob('*.html'))]
+
+    return [synthetic_page()]
+
+
+def main():
+    corpus = load_corpus()
+    legacy_time = new_time = 0
+    mismatches = 0
+
+    for content in corpus:
+        soup = BeautifulSoup(content, 'html.parser')
+        ids = [article.get('data-id') for article in soup.select('li[class="pdt-item"]')]
+
+        start = time.perf_counter()
+        for _ in range(REPEAT):
+            page_prices = extract_page_prices_legacy(soup)
+            legacy = [lookup_legacy(page_prices, id) for id in ids]
+        legacy_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(REPEAT):
+            page_prices = las.extract_page_prices(content)
+            new = [page_prices.get(id) for id in ids]
+        new_time += time.perf_counter() - start
+
+        mismatches += sum(a != b for a, b in zip(legacy, new))
+
+    pages = len(corpus) * REPEAT
+    print(f"{len(corpus)} pages, {mismatches} mismatching prices")
+    print(f"legacy  {legacy_time / pages * 1000:8.3f} ms/page")
+    print(f"indexed {new_time / pages * 1000:8.3f} ms/page  x{legacy_time / new_time:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import datetime
+import time
+
+import numpy
+import pandas
+import project.sample.ldlc_archive_scraper as las
+
+SIZES = [62_500, 125_000, 250_000, 500_000]
+TARGET = las.TARGETS[0]
+
+# Share of the capture days already fully scraped
+PROCESSED_RATIO = 0.5
+
+
+def synthetic_cdx(size, seed=0):
+    """ Builds a CDX frame of size captures, several per day as for the LDLC category pages. """
+
+    rng = numpy.random.default_rng(seed)
+    start = numpy.datetime64('2010-01-01T00:00:00')
+    # Spreads captures over about 30 years so that days get several captures each
+    seconds = rng.integers(0, 30 * 365 * 24 * 3600, size)
+    timestamps = pandas.Series(start + seconds.astype('timedelta64[s]')).dt.strftime('%Y%m%d%H%M%S')
+
+    return pandas.DataFrame({
+        'urlkey': 'com,ldlc)/informatique/pieces-informatique/processeur/c4300',
+        'timestamp': timestamps,
+        'original': 'https://www.ldlc.com/informatique/pieces-informatique/processeur/c4300/',
+        'mimetype': 'text/html',
+        'statuscode': '200',
+        'digest': 'AAAA',
+        'length': rng.integers(10_000, 90_000, size).astype(str),
+    })
+
+
+def synthetic_proc_url(df, seed=0):
+    """ Returns processed (category, date) tuples for part of the capture days, as get_proc_url does. """
+
+    rng = numpy.random.default_rng(seed)
+    days = df['timestamp'].str[:8].unique()
+    days = days[rng.random(len(days)) < PROCESSED_RATIO]
+
+    return {(TARGET['category'], datetime.datetime.strptime(day, '%Y%m%d').date()) for day in days}
+
+
+def process_df_legacy(df, target, proc_url):
+    """ Former process_df, with row-wise applies and a tuple anti-join. """
+
+    df['date'] = df['timestamp'].apply(lambda x: str(x)[:4]+"-"+str(x)[4:6]+"-"+str(x)[6:8])
+    df['category'] = target['category']
+    df['url'] = df.apply(lambda row: f'https://web.archive.org/web/{row["timestamp"]}/{row["original"]}', axis=1)
+    df['length'] = df['length'].astype(int)
+
+    idx = df.groupby('date')['length'].idxmax()
+    df = df.loc[idx]
+
+    proc_url = [(row[0], row[1].strftime('%Y-%m-%d')) for row in proc_url]
+    df = df[~df[['category', 'date']].apply(tuple, axis=1).isin(proc_url)]
+
+    df = df.reset_index()
+
+    return df
+
+
+def main():
+    for size in SIZES:
+        cdx = synthetic_cdx(size)
+        proc_url = synthetic_proc_url(cdx)
+
+        start = time.perf_counter()
+        legacy = process_df_legacy(cdx.copy(), TARGET, proc_url)
+        legacy_time = time.perf_counter() - start
+
+        # process_df reads the processed URLs from the database
+        las.dbc.get_proc_url = lambda: proc_url
+        start = time.perf_counter()
+        new = las.process_df(cdx.copy(), TARGET)
+        new_time = time.perf_counter() - start
+
+        identical = legacy.equals(new)
+        print(f"{size:>8} captures -> {len(new):>6} urls  legacy {legacy_time:7.3f} s ({legacy_time / size * 1e6:5.2f} us/row)  "
+              f"vectorized {new_time:7.3f} s ({new_time / size * 1e6:5.2f} us/row)  x{legacy_time / new_time:5.1f}  identical: {identical}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import asyncio
+import socket
+from datetime import datetime
+
+import aiohttp
+from aiohttp import web
+import project.sample.proxy_retriever as proxy_retriever
+
+# Requested through the stub proxies, which answer it themselves, so nothing leaves the machine
+PROBE_URL = 'http://probe.test/ip'
+FAST_DELAY = 0.01
+# Above the latency cap set for the check, below PROBE_TIMEOUT
+SLOW_DELAY = 0.5
+MAX_LATENCY = 0.25
+
+
+def stub_proxy(delay=FAST_DELAY, failures=0):
+    """ Builds a stub HTTP proxy answering PROBE_URL after delay seconds, its first failures requests with a 502. """
+
+    requests = []
+
+    async def handle(request):
+        # Proxied requests carry the target host, not the one of the proxy
+        assert request.host == 'probe.test', request.host
+        requests.append(request.path)
+        await asyncio.sleep(delay)
+        if len(requests) <= failures:
+            return web.Response(status=502)
+
+        return web.json_response({'origin': '127.0.0.1'})
+
+    app = web.Application()
+    app.router.add_get('/ip', handle)
+
+    return app, requests
+
+
+async def start_stub_proxy(app):
+    """ Serves a stub proxy on a free local port, returning its runner and port. """
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+
+    return runner, runner.addresses[0][1]
+
+
+def free_port():
+    """ Returns a local port nothing listens on, standing for a dead proxy. """
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def check():
+    """ Validates a fast, a flaky, a slow and a dead stub proxy, checking which ones are kept with their score and expiry. """
+
+    proxy_retriever.MAX_LATENCY = MAX_LATENCY
+    runners = {}
+    proxies = {}
+    for name, delay, failures in (('fast', FAST_DELAY, 0), ('flaky', FAST_DELAY, 1), ('slow', SLOW_DELAY, 0)):
+        app, requests = stub_proxy(delay, failures)
+        runners[name], port = await start_stub_proxy(app)
+        proxies[name] = {'ip': '127.0.0.1', 'port': str(port), 'requests': requests}
+    proxies['dead'] = {'ip': '127.0.0.1', 'port': str(free_port()), 'requests': []}
+
+    try:
+        candidates = [{'ip': proxy['ip'], 'port': proxy['port'], 'name': name} for name, proxy in proxies.items()]
+        pool = await proxy_retriever.validate(candidates, probe_url=PROBE_URL)
+    finally:
+        for runner in runners.values():
+            await runner.cleanup()
+
+    # Every live proxy was probed PROBE_ATTEMPTS times
+    for name in ('fast', 'flaky', 'slow'):
+        assert len(proxies[name]['requests']) == proxy_retriever.PROBE_ATTEMPTS, (name, proxies[name]['requests'])
+
+    # The dead proxy never answered and the slow one is over MAX_LATENCY, the flaky one still being kept
+    kept = {proxy['name']: proxy for proxy in pool}
+    assert list(kept) == ['fast', 'flaky'], list(kept)
+    assert kept['fast']['success_rate'] == 1
+    assert kept['flaky']['success_rate'] == round(2 / 3, 3)
+
+    for proxy in pool:
+        assert 0 < proxy['latency'] < MAX_LATENCY, proxy
+        assert proxy['score'] == proxy_retriever.score_proxy(proxy) == round(proxy['success_rate'] / (1 + proxy['latency']), 3)
+        checked_at = datetime.fromisoformat(proxy['checked_at'])
+        assert datetime.fromisoformat(proxy['expires_at']) - checked_at == proxy_retriever.PROXY_TTL, proxy
+        assert abs((datetime.now(checked_at.tzinfo) - checked_at).total_seconds()) < 60, proxy
+
+    return pool
+
+
+async def check_failures():
+    """ probe_proxy reports a dead proxy with no success and no latency. """
+
+    semaphore = asyncio.Semaphore(1)
+    async with aiohttp.ClientSession() as session:
+        proxy = await proxy_retriever.probe_proxy(session, {'ip': '127.0.0.1', 'port': str(free_port())}, semaphore, PROBE_URL)
+
+    assert proxy['success_rate'] == 0 and proxy['latency'] is None, proxy
+
+
+def main():
+    asyncio.run(check_failures())
+    print('probe_proxy: ok, dead proxy reported')
+
+    pool = asyncio.run(check())
+    for proxy in pool:
+        print(f"validate: ok, {proxy['name']:<6} success {proxy['success_rate']:.3f}  latency {proxy['latency']:.3f} s  score {proxy['score']:.3f}  expires {proxy['expires_at']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+import asyncio
+import email.utils
+import logging
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+from project.sample.http_cache import is_snapshot_url
+from project.sample.identity_pool import is_healthy_status
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/107.0.0.0 Safari/537.36 OPR/93.0.0.0'
+
+# Total number of sockets kept open by one fetcher and default cap per host
+MAX_CONNECTIONS = 300
+DEFAULT_HOST_LIMIT = 20
+
+# Per-host caps, web.archive.org being the main target of the archive scraper. They hold across
+# all the processes of a scraper, each fetcher getting its share of them
+HOST_LIMITS = {
+    'web.archive.org': 30,
+}
+
+RETRY_DELAY = 10
+MAX_RETRIES = 5
+# Throttled and server error responses are retried too, after their Retry-After delay when given,
+# an exponential backoff from RETRY_DELAY otherwise, both capped
+MAX_RETRY_DELAY = 300
+
+logger = logging.getLogger(__name__)
+
+
+def is_retryable_status(status):
+    """ Tells if a response status is worth retrying: throttled (429) or server error (5xx). """
+
+    return status == 429 or status >= 500
+
+
+def get_retry_delay(headers, attempt):
+    """ Returns the seconds to wait before retrying a response, from its Retry-After header
+    (seconds or HTTP date) when given, with an exponential backoff otherwise. """
+
+    delay = RETRY_DELAY * 2 ** (attempt - 1)
+    retry_after = headers.get('Retry-After')
+    if retry_after is not None:
+        if retry_after.strip().isdigit():
+            delay = int(retry_after)
+        else:
+            try:
+                delay = email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                pass
+
+    return min(max(delay, 0), MAX_RETRY_DELAY)
+
+
+class AsyncFetcher:
+    """
+    Asynchronous HTTP client sharing one pool of keep-alive connections.
+
+    Attributes:
+        max_connections (int): Maximum number of open connections.
+        host_limits (dict): Maximum number of requests in flight per host.
+        default_host_limit (int): Cap used for hosts missing from host_limits.
+        timeout (float): Total timeout of a request in seconds.
+        cache (HttpCache): Optional on-disk cache of the immutable snapshot responses.
+        identities (IdentityPool): Optional pool of proxies and user-agents rotated across requests.
+        processes (int): Number of processes running a fetcher each, sharing the per-host caps.
+
+    Methods:
+        fetch(url): Returns the response body (bytes) of a GET request.
+        fetch_all(urls): Returns the bodies of several urls, in order.
+        close(): Closes the underlying session.
+    """
+
+    def __init__(self, max_connections=MAX_CONNECTIONS, host_limits=None, default_host_limit=DEFAULT_HOST_LIMIT, timeout=60, cache=None, identities=None, processes=1):
+        self.max_connections = max_connections
+        self.host_limits = dict(HOST_LIMITS, **(host_limits or {}))
+        self.default_host_limit = default_host_limit
+        self.timeout = timeout
+        self.cache = cache
+        self.identities = identities
+        self.processes = processes
+        self._semaphores = {}
+        self._session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections,
+            limit_per_host=0,
+            keepalive_timeout=30,
+            ttl_dns_cache=300,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            headers={'User-agent': USER_AGENT},
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_semaphore(self, url):
+        """ Returns the semaphore capping concurrent requests for the url host, at this process share of the cap. """
+
+        host = urlsplit(url).hostname or ''
+        if host not in self._semaphores:
+            limit = self.host_limits.get(host, self.default_host_limit)
+            self._semaphores[host] = asyncio.Semaphore(max(1, limit // self.processes))
+
+        return self._semaphores[host]
+
+    async def fetch(self, url):
+        """ Gets response body from url, retrying on connection errors, 429 and 5xx responses,
+        the last of which raises aiohttp.ClientResponseError.
+        Snapshots are served from and stored into the cache when one is given. """
+
+        if urlsplit(url).scheme not in ('http', 'https'):
+            raise aiohttp.InvalidURL(url)
+
+        cacheable = self.cache is not None and is_snapshot_url(url)
+        if cacheable:
+            content = self.cache.get(url)
+            if content is not None:
+                return content
+
+        semaphore = self._get_semaphore(url)
+
+        for attempt in range(1, MAX_RETRIES + 1):
+            # Each attempt goes through another identity when a pool is given
+            identity = self.identities.acquire() if self.identities is not None else None
+            options = {} if identity is None else {'proxy': identity.proxy_url(), 'headers': {'User-agent': identity.user_agent}}
+            try:
+                async with semaphore:
+                    start = time.perf_counter()
+                    async with self._session.get(url, **options) as response:
+                        content = await response.read()
+                if identity is not None:
+                    self.identities.report(identity, ok=is_healthy_status(response.status), latency=time.perf_counter() - start)
+                if is_retryable_status(response.status):
+                    if attempt == MAX_RETRIES:
+                        raise aiohttp.ClientResponseError(response.request_info, response.history, status=response.status, message=response.reason, headers=response.headers)
+                    delay = get_retry_delay(response.headers, attempt)
+                    logger.warning(f"FETCH :: RETRY {attempt}/{MAX_RETRIES} :: {url}, status {response.status}, waiting {delay:.1f} s")
+                    await asyncio.sleep(delay)
+                    continue
+                if cacheable and response.status == 200:
+                    self.cache.put(url, content)
+                return content
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                if identity is not None:
+                    self.identities.report(identity, ok=False)
+                if attempt == MAX_RETRIES:
+                    raise
+                logger.warning(f"FETCH :: RETRY {attempt}/{MAX_RETRIES} :: {url}, {e!r}")
+                await asyncio.sleep(RETRY_DELAY)
+
+    async def fetch_all(self, urls):
+        """ Gets response bodies from several urls concurrently, in the same order. """
+
+        return await asyncio.gather(*(self.fetch(url) for url in urls))
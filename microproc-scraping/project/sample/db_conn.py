@@ -1,135 +1,360 @@
-import psycopg2, pathlib, datetime, csv, json, decimal
+import psycopg2, pathlib, datetime, csv, json, decimal, os, threading, contextlib, io, gzip, shutil, time, sys
+from concurrent.futures import ProcessPoolExecutor
 # Weirdly enough, I need to make this separate import to get the psycopg2 sql module
-from psycopg2 import sql
+from psycopg2 import sql, extras, pool
+import pyarrow
+import pyarrow.compute
+import pyarrow.dataset
 
 ROOT_DIR = pathlib.Path(__file__).resolve().parent
 DATA_DIR = pathlib.Path(ROOT_DIR.parent, 'data')
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
-HOST = 'localhost'
-USER = 'postgres'
-PASSWORD = 'your_password'
-PORT = 5432
-DATABASE_NAME = 'electronics'
+HOST = os.environ.get('ELECTRONICS_DB_HOST', 'localhost')
+USER = os.environ.get('ELECTRONICS_DB_USER', 'postgres')
+PASSWORD = os.environ.get('ELECTRONICS_DB_PASSWORD', 'your_password')
+PORT = int(os.environ.get('ELECTRONICS_DB_PORT', 5432))
+DATABASE_NAME = os.environ.get('ELECTRONICS_DB_NAME', 'electronics')
+
+POOL_MIN_SIZE = int(os.environ.get('ELECTRONICS_DB_POOL_MIN', 1))
+POOL_MAX_SIZE = int(os.environ.get('ELECTRONICS_DB_POOL_MAX', 10))
 
 TABLE_NAME = 'products'
 
+# Tables of the database, created by ensure_schema along with their unique indexes (name -> columns)
+SCHEMA = {
+    'scraped_urls': {
+        'columns': [
+            'id SERIAL PRIMARY KEY',
+            'url VARCHAR(160)',
+            'category VARCHAR(30)',
+            'date DATE NOT NULL',
+            "status VARCHAR(7) NOT NULL CHECK (status IN ('PENDING', 'DONE'))",
+        ],
+        'unique_indexes': {'scraped_urls_url_idx': ['url']},
+    },
+    'products': {
+        'columns': [
+            'id SERIAL PRIMARY KEY',
+            'sku VARCHAR(14)',
+            'category VARCHAR(30)',
+            'title VARCHAR(120)',
+            'description VARCHAR(140)',
+            'model VARCHAR(120)',
+            'price NUMERIC',
+            'date DATE NOT NULL',
+        ],
+        # Target of the ON CONFLICT (date, sku) clauses of the scrapers
+        'unique_indexes': {'products_date_sku_idx': ['date', 'sku']},
+    },
+    'cpu_specs': {
+        'columns': [
+            'id SERIAL PRIMARY KEY',
+            'model VARCHAR(40)',
+            'process_size_nm NUMERIC',
+            'transistor_count NUMERIC',
+            'die_size_mm2 NUMERIC',
+            'launch_price_usd NUMERIC',
+            'release_date DATE',
+            'core_count NUMERIC',
+            'thread_count NUMERIC',
+            'frequency_ghz NUMERIC',
+            'tdp_w NUMERIC',
+            'foundry VARCHAR(20)',
+        ],
+        'unique_indexes': {'cpu_specs_model_idx': ['model']},
+    },
+    'gpu_specs': {
+        'columns': [
+            'id SERIAL PRIMARY KEY',
+            'model VARCHAR(30)',
+            'architecture VARCHAR(20)',
+            'process_size_nm NUMERIC',
+            'transistor_count NUMERIC',
+            'density_m_per_mm2 VARCHAR(120)',
+            'die_size_mm2 NUMERIC',
+            'tdp_w NUMERIC',
+            'memory_size_gb NUMERIC',
+            'memory_type VARCHAR(12)',
+            'launch_price_usd NUMERIC',
+            'release_date DATE',
+            'tensor_core_count NUMERIC',
+            'pixel_rate_gpixel_per_s NUMERIC',
+            'texture_rate_gtexel_per_s NUMERIC',
+            'fp32_tflops NUMERIC',
+            'base_clock_mhz NUMERIC',
+            'boost_clock_mhz NUMERIC',
+            'foundry VARCHAR(20)',
+        ],
+        'unique_indexes': {'gpu_specs_model_idx': ['model']},
+    },
+}
+
+EXPORT_DIR = pathlib.Path(os.environ.get('ELECTRONICS_EXPORT_DIR', pathlib.Path(DATA_DIR, 'pg_exports')))
+EXPORT_TABLES = ('gpu_prices', 'cpu_prices', 'gpu_specs', 'cpu_specs')
+# Processes writing files at the same time in export_tables, the JSON encoding holding the GIL
+EXPORT_WORKERS = 4
+# Last row exported of each table, and the delta files written since its full export
+WATERMARKS_FILE_NAME = 'watermarks.json'
+# Columns tracked by the watermarks, by preference
+WATERMARK_COLUMNS = ('id', 'date')
+# Tables exported incrementally, their rows being only ever added in id order: the price tables are
+# filled in one transaction by the migration. The specs tables are upserted by copy_upsert, updated rows
+# keeping their id, and products ids are taken by concurrent scraper transactions which may commit out of
+# order, a row below the watermark showing up after the export, so these are always exported in full
+APPEND_ONLY_TABLES = ('cpu_prices', 'gpu_prices')
+EXPORT_FORMATS = ('csv', 'json', 'parquet')
+# Rows fetched per round trip by the server-side cursor of the JSON export
+EXPORT_ITERSIZE = 10000
+# JSON Lines instead of a single JSON array, and gzipped files (.gz suffix)
+EXPORT_JSON_LINES = False
+EXPORT_COMPRESS = False
+# Parquet datasets are split in category=/year= directories, on the columns a table has
+PARQUET_PARTITIONS = ('category', 'year')
+PARQUET_COMPRESSION = 'zstd'
+# Rows buffered per partition before a row group is written, batches being scattered over the partitions
+PARQUET_ROW_GROUP_SIZE = 64 * 1024
+
+# Decimal places of the unconstrained NUMERIC columns in Parquet, fixed so that delta files keep the
+# schema of their base. Values with more decimal places, such as float artefacts in the specs, are rounded
+NUMERIC_SCALE = 10
+
+# Arrow types of the PostgreSQL columns, other types being exported as strings
+ARROW_TYPES = {
+    'smallint': pyarrow.int16(),
+    'integer': pyarrow.int32(),
+    'bigint': pyarrow.int64(),
+    'real': pyarrow.float32(),
+    'double precision': pyarrow.float64(),
+    'boolean': pyarrow.bool_(),
+    'date': pyarrow.date32(),
+    'timestamp without time zone': pyarrow.timestamp('us'),
+    'timestamp with time zone': pyarrow.timestamp('us', tz='UTC'),
+}
+
+
+def connection_params(database=DATABASE_NAME):
+    """ Returns the connection parameters of the given database. """
+
+    return {
+        'host': HOST,
+        'user': USER,
+        'password': PASSWORD,
+        'port': PORT,
+        'database': database,
+    }
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of connections to the electronics database.
+    Unlike psycopg2 pools, borrowing blocks while all connections are in use.
+
+    Attributes:
+        minconn (int): Number of connections opened upfront.
+        maxconn (int): Maximum number of open connections.
+        pid (int): Id of the process owning the connections.
+
+    Methods:
+        getconn(timeout): Borrows a connection, waiting at most timeout seconds.
+        putconn(conn): Gives a connection back to the pool.
+        closeall(): Closes all connections.
+    """
+
+    def __init__(self, minconn=POOL_MIN_SIZE, maxconn=POOL_MAX_SIZE):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.pid = os.getpid()
+        self._pool = pool.ThreadedConnectionPool(minconn, maxconn, **connection_params())
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+    def getconn(self, timeout=None):
+        if not self._slots.acquire(timeout=timeout):
+            raise pool.PoolError(f"No connection available after {timeout} seconds")
+        try:
+            return self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn):
+        try:
+            self._pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            self._slots.release()
+
+    def closeall(self):
+        self._pool.closeall()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+# Pools inherited through fork are kept referenced and never closed in the child,
+# since closing them would terminate the parent's sessions sharing the same sockets
+_inherited_pools = []
+
+
+def _reset_pool_after_fork():
+    global _pool, _pool_lock
+
+    if _pool is not None:
+        _inherited_pools.append(_pool)
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_pool_after_fork)
+
+
+def init_pool(minconn=POOL_MIN_SIZE, maxconn=POOL_MAX_SIZE):
+    """ Creates the process connection pool, replacing the existing one. """
+
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None and _pool.pid == os.getpid():
+            _pool.closeall()
+        _pool = ConnectionPool(minconn, maxconn)
+
+    return _pool
+
+
+def get_pool():
+    """ Returns the process connection pool, creating it on first use. """
+
+    global _pool
+
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = ConnectionPool()
+
+    return _pool
+
+
+def close_pool():
+    """ Closes all connections of the process connection pool. """
+
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None and _pool.pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+
+
+@contextlib.contextmanager
+def connection(timeout=None):
+    """ Borrows a pooled connection, committing on success and rolling back on error. """
+
+    conn_pool = get_pool()
+    conn = conn_pool.getconn(timeout=timeout)
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        conn_pool.putconn(conn)
 
-def db_init():
-    """ Checks if database, tables and their constraints exist. 
-    If they do not, creates them. """
 
-    # Connect to the default PostgreSQL database
-    pg_conn = psycopg2.connect(
-        host=HOST,
-        user=USER,
-        password=PASSWORD,
-        port=PORT,
-    )   
-
-    # Check if the database exists
-    with pg_conn.cursor() as cur:
-        cur.execute(f"SELECT 1 FROM pg_database WHERE datname='{DATABASE_NAME}';")
-        exists = cur.fetchone()
-
-    # Create the database if it doesn't exist
-    if not exists:
+def ensure_database():
+    """ Creates the database if it does not exist. The pool is tried first,
+    the default database being only reached when the connection is refused. """
+
+    try:
+        get_pool()
+        return
+    except psycopg2.OperationalError as e:
+        if f'"{DATABASE_NAME}" does not exist' not in str(e):
+            raise
+
+    # Connect to the default PostgreSQL database, outside of the pool
+    pg_conn = psycopg2.connect(**connection_params(database='postgres'))
+    # CREATE DATABASE cannot run inside a transaction block
+    pg_conn.autocommit = True
+    try:
         with pg_conn.cursor() as cur:
-            cur.execute(f"CREATE DATABASE {DATABASE_NAME};")
-            pg_conn.commit()
+            cur.execute(sql.SQL("CREATE DATABASE {};").format(sql.Identifier(DATABASE_NAME)))
+    finally:
+        pg_conn.close()
 
-        print(f"Database '{DATABASE_NAME}' successfully created.")
-    else:
-        print(f"Database '{DATABASE_NAME}' already exists.")
+    print(f"Database '{DATABASE_NAME}' successfully created.")
 
-    pg_conn.close()
 
-    db_conn = psycopg2.connect(
-        host=HOST,
-        user=USER,
-        password=PASSWORD,
-        port=PORT,
-        database=DATABASE_NAME,
-    )
+def table_ddl(table):
+    """ Returns the idempotent statements creating a table of SCHEMA and its unique indexes. """
 
-    # Create the 'scraped_urls' table if it doesn't exist
-    with db_conn.cursor() as cur:
-        cur.execute(f"""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                AND table_name = 'scraped_urls'
-            );
-        """)
-        exists = cur.fetchone()[0]
+    spec = SCHEMA[table]
+    statements = [
+        sql.SQL("CREATE TABLE IF NOT EXISTS {} ({});").format(
+            sql.Identifier(table),
+            sql.SQL(', ').join(sql.SQL(column) for column in spec['columns'])
+        )
+    ]
+    for index, columns in spec['unique_indexes'].items():
+        statements.append(
+            sql.SQL("CREATE UNIQUE INDEX IF NOT EXISTS {} ON {} ({});").format(
+                sql.Identifier(index),
+                sql.Identifier(table),
+                sql.SQL(', ').join(sql.Identifier(column) for column in columns)
+            )
+        )
 
-    if not exists:
-        try:
-            with db_conn.cursor() as cur:
-                cur.execute(f"""
-                    CREATE TABLE scraped_urls (
-                        id SERIAL PRIMARY KEY,
-                        url VARCHAR(160),
-                        category VARCHAR(30),
-                        date DATE NOT NULL,
-                        status VARCHAR(7) NOT NULL CHECK (status IN ('PENDING', 'DONE'))
-                    );
-                """)
-                # Add a unique constraint on the url
-                cur.execute(f"""
-                    CREATE UNIQUE INDEX scraped_urls_url_idx
-                    ON scraped_urls (url);
-                """)
-                db_conn.commit()
-            print(f"Table 'scraped_urls' and its constraints successfully created.")
-        except Exception as e:
-            print("Error creating table 'scraped_urls': {e}")
-            db_conn.rollback()
-    else:
-        print(f"Table 'scraped_urls' and its related constraints already exist.")
+    return statements
 
-    # Create the 'products' table if it doesn't exist
-    with db_conn.cursor() as cur:
-        cur.execute(f"""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                AND table_name = 'products'
-            );
-        """)
-        exists = cur.fetchone()[0]
 
-    if not exists:
-        try:
+# Tables of SCHEMA known to exist with their indexes, which forked processes inherit
+_ensured_tables = set()
+_ensured_tables_lock = threading.Lock()
+
+
+def ensure_schema(tables=tuple(SCHEMA)):
+    """ Creates the missing tables of SCHEMA and their unique indexes. A single catalog query tells
+    which relations are missing, and all of them are created in one transaction and round trip.
+    Tables already ensured by the process are skipped without querying the database.
+    Returns the relations created. """
+
+    with _ensured_tables_lock:
+        tables = [table for table in tables if table not in _ensured_tables]
+        if not tables:
+            return []
+
+        relations = [(table, None) for table in tables] + [(table, index) for table in tables for index in SCHEMA[table]['unique_indexes']]
+
+        with connection() as db_conn:
             with db_conn.cursor() as cur:
-                cur.execute(f"""
-                    CREATE TABLE products (
-                        id SERIAL PRIMARY KEY,
-                        sku VARCHAR(14),
-                        category VARCHAR(30),
-                        title VARCHAR(120),
-                        description VARCHAR(140),
-                        model VARCHAR(120),
-                        price NUMERIC,
-                        date DATE NOT NULL
-                    );
-                """)
+                cur.execute("""
+                    SELECT relname
+                    FROM pg_class
+                    JOIN pg_namespace ON pg_namespace.oid = pg_class.relnamespace
+                    WHERE nspname = 'public'
+                    AND relname = ANY(%s);
+                """, ([index or table for table, index in relations],))
+                existing = {row[0] for row in cur.fetchall()}
 
-                # Add a unique constraint on the combination of timestamp and sku
-                cur.execute(f"""
-                    CREATE UNIQUE INDEX products_date_sku_idx
-                    ON products (date, sku);
-                """)
-                db_conn.commit()
-            print(f"Table 'products' successfully created.")
-        except Exception as e:
-            print(f"Error creating table 'products': {e}")
-            db_conn.rollback()
-    else:
-        print(f"Table 'products' and its related constraints already exist.")
+            created = [index or table for table, index in relations if (index or table) not in existing]
+            # Statements of existing relations are no-ops, thanks to IF NOT EXISTS
+            incomplete = list(dict.fromkeys(table for table, index in relations if (index or table) in created))
+            if incomplete:
+                with db_conn.cursor() as cur:
+                    cur.execute(sql.SQL('\n').join(statement for table in incomplete for statement in table_ddl(table)))
+
+        _ensured_tables.update(tables)
+
+    for relation in created:
+        print(f"Relation '{relation}' successfully created.")
+
+    return created
 
-    # Close the connection
-    db_conn.close()
+
+def db_init():
+    """ Checks if database, tables and their constraints exist. 
+    If they do not, creates them. """
+
+    ensure_database()
+    ensure_schema(('scraped_urls', 'products'))
 
 
 def is_prod_proc(conn, date, sku):
@@ -165,6 +390,83 @@ def add_data_to_products_tb(conn, dict):
         for element in dict: print(dict[element])
 
 
+class ProductWriter:
+    """
+    Buffers products rows and writes them in a single multi-row INSERT per flush.
+    Rows whose (date, sku) pair already exists are skipped by the database
+    using the products_date_sku_idx unique index.
+
+    Attributes:
+        conn (connection): Database connection used for flushing.
+        rows (list): Buffered products rows, as returned by Product.to_dict().
+        written (int): Number of rows inserted.
+        skipped (int): Number of rows already in the products table.
+        failed (int): Number of rows lost in failed flushes.
+        flushes (int): Number of INSERT statements sent to the database.
+
+    Methods:
+        add(dict): Buffers a products row.
+        flush(): Writes buffered rows and returns the number of inserted rows.
+        stats(): Returns a dictionary with the writer counters.
+    """
+
+    COLUMNS = ('sku', 'category', 'title', 'description', 'model', 'price', 'date')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+        self.written = 0
+        self.skipped = 0
+        self.failed = 0
+        self.flushes = 0
+
+    def add(self, dict):
+        self.rows.append(tuple(dict[column] for column in self.COLUMNS))
+
+    def flush(self):
+        if not self.rows:
+            return 0
+
+        rows, self.rows = self.rows, []
+        query = f"""
+            INSERT INTO products ({', '.join(self.COLUMNS)})
+            VALUES %s
+            ON CONFLICT (date, sku) DO NOTHING
+            RETURNING 1;
+        """
+
+        # The savepoint keeps a failed batch from aborting the whole URL transaction
+        with self.conn.cursor() as cur:
+            cur.execute("SAVEPOINT product_writer;")
+            try:
+                inserted = len(extras.execute_values(cur, query, rows, page_size=len(rows), fetch=True))
+            except psycopg2.Error as e:
+                cur.execute("ROLLBACK TO SAVEPOINT product_writer;")
+                self.failed += len(rows)
+                print(f"Error writing {len(rows)} rows to table 'products': {e}")
+                return 0
+            finally:
+                cur.execute("RELEASE SAVEPOINT product_writer;")
+
+        self.flushes += 1
+        self.written += inserted
+        self.skipped += len(rows) - inserted
+
+        return inserted
+
+    def stats(self):
+        # Per-row path costs one SELECT EXISTS per row plus one INSERT per new row
+        row_by_row = self.written + self.skipped + self.written
+
+        return {
+            'written': self.written,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'round_trips': self.flushes,
+            'round_trips_saved': row_by_row - self.flushes,
+        }
+
+
 def init_entry_url_tb(conn, dict):
     """ Checks whether url entry exists in scraped_urls table.
     If it does not, creates the entry. """
@@ -213,27 +515,35 @@ def is_url_proc(conn, dict):
 def get_proc_url():
     """ Gets all processed urls as a set of tuples. """
 
-    db_conn = psycopg2.connect(
-        host=HOST,
-        user=USER,
-        password=PASSWORD,
-        port=PORT,
-        database=DATABASE_NAME,
-    )
-
-    with db_conn.cursor() as cur:
-        cur.execute(f"""
-            SELECT category, date
-            FROM scraped_urls
-            WHERE status = 'DONE';
-        """)
-        proc_url = set(cur.fetchall())
-    
-    db_conn.close()
+    with connection() as db_conn:
+        with db_conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT category, date
+                FROM scraped_urls
+                WHERE status = 'DONE';
+            """)
+            proc_url = set(cur.fetchall())
 
     return proc_url
 
 
+def get_resume_date(category):
+    """ Gets the first date to list for an incremental run of a category: the earliest url
+    not fully scraped, otherwise the day after the latest one, or None if there is none. """
+
+    with connection() as db_conn:
+        with db_conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT COALESCE(MIN(date) FILTER (WHERE status <> 'DONE'), MAX(date) + 1)
+                FROM scraped_urls
+                WHERE category = %s;
+            """,
+            (category,))
+            resume_date = cur.fetchone()[0]
+
+    return resume_date
+
+
 def update_url_row(conn, dict):
     """ Sets a url entry status to 'DONE'. """
 
@@ -274,19 +584,10 @@ class CustomEncoder(json.JSONEncoder):
         return super().default(obj)
 
 
-def export_table(table):
-    """ Exports PostgreSQL data to JSON and CSV formats. """
+def table_exists(conn, table):
+    """ Checks if a table exists in the public schema. """
 
-    db_conn = psycopg2.connect(
-        host=HOST,
-        user=USER,
-        password=PASSWORD,
-        port=PORT,
-        database=DATABASE_NAME,
-    )
-
-    # Create the 'products' table if it doesn't exist
-    with db_conn.cursor() as cur:
+    with conn.cursor() as cur:
         cur.execute(
             sql.SQL("""
                 SELECT EXISTS (
@@ -297,71 +598,601 @@ def export_table(table):
             """)
             .format(sql.Literal(table))
         )
-        exists = cur.fetchone()[0]
-    
-    if exists:
-        with db_conn.cursor() as cur:
+        return cur.fetchone()[0]
+
+
+def export_path(table, extension, compress=EXPORT_COMPRESS, suffix=''):
+    """ Returns the path of an export file in EXPORT_DIR. """
+
+    return pathlib.Path(EXPORT_DIR, f'{table}_dataset{suffix}.{extension}' + ('.gz' if compress else ''))
+
+
+def open_export(path, compress=EXPORT_COMPRESS, mode='w'):
+    """ Opens an export file as text, gzipped if compress. """
+
+    if compress:
+        return gzip.open(path, f'{mode}t', encoding='utf-8', newline='')
+
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def delta_filter(column, lower, upper):
+    """ Returns the WHERE clause selecting the rows above the lower watermark, up to the upper one.
+    A None lower watermark stands for an empty table at the previous export. """
+
+    if lower is None:
+        return sql.SQL("WHERE {} <= {}").format(sql.Identifier(column), sql.Literal(upper))
+
+    return sql.SQL("WHERE {0} > {1} AND {0} <= {2}").format(sql.Identifier(column), sql.Literal(lower), sql.Literal(upper))
+
+
+def export_csv(conn, table, compress=EXPORT_COMPRESS, where=None, path=None):
+    """ Streams a table, or its rows matching where, to CSV through COPY TO STDOUT,
+    the rows never being loaded in Python. """
+
+    path = export_path(table, 'csv', compress) if path is None else path
+    if where is None:
+        source = sql.Identifier(table)
+    else:
+        source = sql.SQL("(SELECT * FROM {} {})").format(sql.Identifier(table), where)
+
+    with open_export(path, compress) as csvfile:
+        with conn.cursor() as cur:
+            cur.copy_expert(
+                sql.SQL("COPY {} TO STDOUT WITH (FORMAT csv, HEADER true)")
+                .format(source),
+                csvfile
+            )
+
+    return path
+
+
+def export_json(conn, table, json_lines=EXPORT_JSON_LINES, compress=EXPORT_COMPRESS, itersize=EXPORT_ITERSIZE, where=None, path=None):
+    """ Streams a table, or its rows matching where, to a JSON array, or to JSON Lines if json_lines,
+    through a server-side cursor fetching itersize rows per round trip.
+    Returns the path and the number of rows written. """
+
+    path = export_path(table, 'jsonl' if json_lines else 'json', compress) if path is None else path
+    count = 0
+
+    with open_export(path, compress) as jsonfile:
+        # Named cursors only live in a transaction, which connection() provides
+        with conn.cursor(name=f'export_{table}') as cur:
+            cur.itersize = itersize
             cur.execute(
-                sql.SQL("SELECT * FROM {}")
-                .format(sql.Identifier(table))
+                sql.SQL("SELECT * FROM {} {}")
+                .format(sql.Identifier(table), where or sql.SQL(''))
             )
-            rows = cur.fetchall()
-        
-        # Export to CSV
-        with open(pathlib.Path(DATA_DIR, 'pg_exports', f'{table}_dataset.csv'), 'w', newline='', encoding='utf-8') as csvfile:
-            csvwriter = csv.writer(csvfile)
-            csvwriter.writerow([desc[0] for desc in cur.description])
-            csvwriter.writerows(rows)
-
-        # Export to JSON
-        with open(pathlib.Path(DATA_DIR, 'pg_exports', f'{table}_dataset.json'), 'w', encoding='utf-8') as jsonfile:
-            column_names = [desc[0] for desc in cur.description]
-            data = [dict(zip(column_names, row)) for row in rows]
-            json.dump(data, jsonfile, cls=CustomEncoder, ensure_ascii=False)
 
-    else:
-        print(f"Table '{table}' does not exist, it can't be exported.")
+            column_names = None
+            if not json_lines:
+                jsonfile.write('[')
+            for row in cur:
+                # The description of a named cursor is only known once its first rows are fetched
+                if column_names is None:
+                    column_names = [desc[0] for desc in cur.description]
+                record = json.dumps(dict(zip(column_names, row)), cls=CustomEncoder, ensure_ascii=False)
+                if json_lines:
+                    jsonfile.write(record + '\n')
+                else:
+                    # Same layout as json.dump
+                    jsonfile.write((', ' if count else '') + record)
+                count += 1
+            if not json_lines:
+                jsonfile.write(']')
 
-    db_conn.close()
+    return path, count
 
 
-def get_table_as_records(table):
-    db_conn = psycopg2.connect(
-        host=HOST,
-        user=USER,
-        password=PASSWORD,
-        port=PORT,
-        database=DATABASE_NAME,
+def numeric_type(precision, scale):
+    """ Returns the Arrow decimal type holding precision digits, scale of them after the point. """
+
+    # Keeps at least one digit before the point, e.g. for NUMERIC(2, 2)
+    precision = max(precision, scale + 1)
+    if precision <= 38:
+        return pyarrow.decimal128(precision, scale)
+
+    return pyarrow.decimal256(precision, scale)
+
+
+def arrow_schema(conn, table):
+    """ Returns the Arrow schema of a table. Unconstrained NUMERIC columns, such as all the ones
+    of this database, get the widest decimal128 precision and NUMERIC_SCALE decimal places,
+    so that later delta files keep fitting the schema as values grow. export_parquet rounds their values. """
+
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT column_name, data_type, numeric_precision, numeric_scale
+            FROM information_schema.columns
+            WHERE table_schema = 'public'
+            AND table_name = %s
+            ORDER BY ordinal_position;
+        """, (table,))
+        columns = cur.fetchall()
+
+    fields = []
+    for name, data_type, precision, scale in columns:
+        if data_type == 'numeric':
+            arrow_type = numeric_type(38, NUMERIC_SCALE) if precision is None else numeric_type(precision, scale)
+        else:
+            arrow_type = ARROW_TYPES.get(data_type, pyarrow.string())
+        fields.append(pyarrow.field(name, arrow_type))
+
+    return pyarrow.schema(fields)
+
+
+def parquet_partitioning(schema):
+    """ Returns the hive partitioning of a dataset schema on PARQUET_PARTITIONS, None if it has none of them. """
+
+    partitions = [schema.field(name) for name in PARQUET_PARTITIONS if name in schema.names]
+    if not partitions:
+        return None
+
+    return pyarrow.dataset.partitioning(pyarrow.schema(partitions), flavor='hive')
+
+
+def write_parquet(data, path, schema, basename='part', existing_data_behavior='error'):
+    """ Writes record batches or a dataset to a Parquet dataset directory, partitioned on PARQUET_PARTITIONS. """
+
+    pyarrow.dataset.write_dataset(
+        data,
+        path,
+        schema=schema,
+        format='parquet',
+        file_options=pyarrow.dataset.ParquetFileFormat().make_write_options(compression=PARQUET_COMPRESSION),
+        partitioning=parquet_partitioning(schema),
+        basename_template=f'{basename}-{{i}}.parquet',
+        min_rows_per_group=PARQUET_ROW_GROUP_SIZE,
+        max_rows_per_group=PARQUET_ROW_GROUP_SIZE,
+        existing_data_behavior=existing_data_behavior,
     )
 
-    with db_conn.cursor() as cur:
-        cur.execute(
-            sql.SQL("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables
-                    WHERE table_schema = 'public'
-                    AND table_name = {}
+
+def read_parquet_dataset(path):
+    """ Opens a Parquet dataset written by export_parquet. """
+
+    return pyarrow.dataset.dataset(path, format='parquet', partitioning='hive')
+
+
+def parquet_column(field):
+    """ Returns the selected expression of a dataset column, decimals being rounded to the scale of their Arrow type,
+    which Arrow would otherwise reject. """
+
+    if pyarrow.types.is_decimal(field.type):
+        return sql.SQL("ROUND({0}, {1}) AS {0}").format(sql.Identifier(field.name), sql.Literal(field.type.scale))
+
+    return sql.Identifier(field.name)
+
+
+def export_parquet(conn, table, itersize=EXPORT_ITERSIZE, where=None, basename='part'):
+    """ Streams a table to a Parquet dataset, one Arrow record batch per itersize rows fetched by a
+    server-side cursor. Tables with a date column get a year column, and the dataset is partitioned
+    on PARQUET_PARTITIONS. Rows matching where are added to the existing dataset as basename files,
+    with its schema. Returns the dataset directory and the number of rows written. """
+
+    path = pathlib.Path(EXPORT_DIR, f'{table}_dataset')
+
+    if where is not None and any(path.rglob('*.parquet')):
+        # The decimal types of the base files are kept, the delta rows being read along with them
+        schema = read_parquet_dataset(path).schema
+    else:
+        schema = arrow_schema(conn, table)
+        if 'date' in schema.names:
+            schema = schema.append(pyarrow.field('year', pyarrow.int16()))
+    if where is None:
+        # A full export replaces the partitions of the previous one
+        shutil.rmtree(path, ignore_errors=True)
+    count = 0
+
+    def batches():
+        nonlocal count
+        with conn.cursor(name=f'export_{table}') as cur:
+            cur.execute(
+                sql.SQL("SELECT {} FROM {} {}").format(
+                    sql.SQL(', ').join(parquet_column(field) for field in schema if field.name != 'year'),
+                    sql.Identifier(table),
+                    where or sql.SQL('')
                 )
-            """)
-            .format(sql.Literal(table))
+            )
+            while True:
+                rows = cur.fetchmany(itersize)
+                if not rows:
+                    break
+                arrays = [pyarrow.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+                if 'year' in schema.names:
+                    arrays.append(pyarrow.compute.year(arrays[schema.get_field_index('date')]).cast(schema.field('year').type))
+                count += len(rows)
+                yield pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+    # Delta files go next to the base ones, in the same partitions
+    write_parquet(batches(), path, schema, basename, 'error' if where is None else 'overwrite_or_ignore')
+
+    return path, count
+
+
+def export_table(table, formats=EXPORT_FORMATS, json_lines=EXPORT_JSON_LINES, compress=EXPORT_COMPRESS, itersize=EXPORT_ITERSIZE):
+    """ Exports PostgreSQL data to JSON, CSV and Parquet formats in EXPORT_DIR.
+    All are streamed, so memory stays flat whatever the table size.
+    Returns the path of each written file, by format. """
+
+    EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    paths = {}
+
+    with connection() as db_conn:
+        if not table_exists(db_conn, table):
+            print(f"Table '{table}' does not exist, it can't be exported.")
+            return paths
+
+        for export_format in formats:
+            paths[export_format] = export_file(db_conn, table, export_format, json_lines, compress, itersize)
+
+    return paths
+
+
+def delta_name(upper):
+    """ Returns the name part of the delta files ending at the upper watermark. """
+
+    return f'delta_{upper}'
+
+
+def delta_files(table, formats, json_lines, compress, upper):
+    """ Returns the files of a delta by format, relative to EXPORT_DIR, Parquet ones as a glob pattern. """
+
+    files = {}
+    for export_format in formats:
+        if export_format == 'csv':
+            files[export_format] = export_path(table, 'csv', compress, f'.{delta_name(upper)}').name
+        elif export_format == 'json':
+            files[export_format] = export_path(table, 'jsonl', compress, f'.{delta_name(upper)}').name
+        elif export_format == 'parquet':
+            files[export_format] = f'{table}_dataset/**/{delta_name(upper)}-*.parquet'
+
+    return files
+
+
+def export_file(conn, table, export_format, json_lines=EXPORT_JSON_LINES, compress=EXPORT_COMPRESS, itersize=EXPORT_ITERSIZE, delta=None):
+    """ Exports a table to one format ('csv', 'json' or 'parquet'), returning the written path.
+    With a (column, lower, upper) delta, only the rows above the lower watermark are exported to a
+    delta file, JSON deltas being written as JSON Lines to be appended to the base file. """
+
+    if delta is None:
+        where = None
+        suffix = ''
+    else:
+        where = delta_filter(*delta)
+        suffix = f'.{delta_name(delta[2])}'
+
+    if export_format == 'csv':
+        return export_csv(conn, table, compress, where, export_path(table, 'csv', compress, suffix))
+    elif export_format == 'json':
+        json_lines = json_lines or delta is not None
+        return export_json(conn, table, json_lines, compress, itersize, where, export_path(table, 'jsonl' if json_lines else 'json', compress, suffix))[0]
+    elif export_format == 'parquet':
+        return export_parquet(conn, table, itersize, where, 'part' if delta is None else delta_name(delta[2]))[0]
+
+    raise ValueError(f"Unknown export format '{export_format}'")
+
+
+def get_existing_tables(conn, tables):
+    """ Returns the tables of the list existing in the public schema, in a single catalog query. """
+
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT table_name
+            FROM information_schema.tables
+            WHERE table_schema = 'public'
+            AND table_name = ANY(%s);
+        """, (list(tables),))
+        existing = {row[0] for row in cur.fetchall()}
+
+    return [table for table in tables if table in existing]
+
+
+def watermarks_path():
+    return pathlib.Path(EXPORT_DIR, WATERMARKS_FILE_NAME)
+
+
+def load_watermarks():
+    """ Loads the export watermarks of all tables. """
+
+    path = watermarks_path()
+    if not path.is_file():
+        return {}
+
+    with path.open('r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_watermarks(watermarks):
+    """ Saves the export watermarks of all tables, replacing the file at once. """
+
+    path = watermarks_path()
+    tmp_path = path.with_suffix('.tmp')
+    with tmp_path.open('w', encoding='utf-8') as file:
+        json.dump(watermarks, file, indent=4)
+    os.replace(tmp_path, path)
+
+
+def get_watermark_bounds(conn, tables):
+    """ Returns the watermark column of each table and its current maximum (None for an empty table),
+    in one catalog query and one query over all tables. """
+
+    if not tables:
+        return {}
+
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT table_name, column_name
+            FROM information_schema.columns
+            WHERE table_schema = 'public'
+            AND table_name = ANY(%s)
+            AND column_name = ANY(%s);
+        """, (list(tables), list(WATERMARK_COLUMNS)))
+        columns = {}
+        for table, column in cur.fetchall():
+            if table not in columns or WATERMARK_COLUMNS.index(column) < WATERMARK_COLUMNS.index(columns[table]):
+                columns[table] = column
+
+    missing = [table for table in tables if table not in columns]
+    if missing:
+        raise ValueError(f"Tables {missing} have none of the watermark columns {WATERMARK_COLUMNS}")
+
+    with conn.cursor() as cur:
+        cur.execute(
+            sql.SQL(" UNION ALL ").join(
+                sql.SQL("SELECT {}, MAX({})::text FROM {}").format(sql.Literal(table), sql.Identifier(columns[table]), sql.Identifier(table))
+                for table in tables
+            )
         )
-        exists = cur.fetchone()[0]
-    
-    if exists:
+        upper = dict(cur.fetchall())
+
+    # Ids are compared as numbers, ISO dates compare as text
+    return {
+        table: (columns[table], int(upper[table]) if columns[table] == 'id' and upper[table] is not None else upper[table])
+        for table in tables
+    }
+
+
+def export_snapshot_file(snapshot, table, export_format, json_lines, compress, itersize, delta=None):
+    """ Exports a table to one format on a connection of the worker process pool, reading the exported snapshot. """
+
+    start = time.perf_counter()
+    with connection() as db_conn:
+        with db_conn.cursor() as cur:
+            # Both must come first in the transaction, which psycopg2 opens on the first statement
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY;")
+            cur.execute(sql.SQL("SET TRANSACTION SNAPSHOT {};").format(sql.Literal(snapshot)))
+        path = export_file(db_conn, table, export_format, json_lines, compress, itersize, delta)
+
+    print(f"Table '{table}' {'delta ' if delta else ''}exported to {export_format} in {time.perf_counter() - start:.1f} s.")
+
+    return path
+
+
+def export_tables(tables=EXPORT_TABLES, formats=EXPORT_FORMATS, workers=EXPORT_WORKERS, json_lines=EXPORT_JSON_LINES, compress=EXPORT_COMPRESS, itersize=EXPORT_ITERSIZE, incremental=False):
+    """ Exports several tables to all formats concurrently, one file per worker process, so that a full
+    export takes about as long as its slowest file. All workers import the snapshot of a leading transaction,
+    the files being consistent with each other as if exported at the same instant.
+    With incremental, APPEND_ONLY_TABLES exported before with the same options only get delta files holding
+    the rows added since their watermark, to be merged later by compact_exports.
+    Returns the path of each written file, by table and format. """
+
+    EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    watermarks = load_watermarks()
+    discard_incomplete_deltas(watermarks)
+    options = {'formats': list(formats), 'json_lines': json_lines, 'compress': compress}
+    paths = {}
+
+    with connection() as leader_conn:
+        with leader_conn.cursor() as cur:
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY;")
+            cur.execute("SELECT pg_export_snapshot();")
+            snapshot = cur.fetchone()[0]
+
+        existing = get_existing_tables(leader_conn, tables)
+        for table in tables:
+            if table not in existing:
+                print(f"Table '{table}' does not exist, it can't be exported.")
+        bounds = get_watermark_bounds(leader_conn, existing)
+
+        deltas = {}
+        for table in existing:
+            column, upper = bounds[table]
+            previous = watermarks.get(table)
+            # Deltas are only appended to base files of the same column and options
+            if incremental and table in APPEND_ONLY_TABLES and previous is not None and previous['column'] == column and all(previous[key] == value for key, value in options.items()):
+                if upper is None or (previous['value'] is not None and upper <= previous['value']):
+                    print(f"Table '{table}' has no new rows since its last export.")
+                    continue
+                deltas[table] = (column, previous['value'], upper)
+            else:
+                deltas[table] = None
+
+        # Deltas are recorded before being written, and the files of a run that did not complete are
+        # removed by the next one, so that a range is never exported twice
+        for table, delta in deltas.items():
+            if delta is None:
+                # A full export supersedes the deltas of the previous base
+                remove_delta_files(watermarks.pop(table, None))
+            else:
+                watermarks[table]['deltas'].append({
+                    'value': delta[2],
+                    'files': delta_files(table, formats, json_lines, compress, delta[2]),
+                    'complete': False,
+                })
+        save_watermarks(watermarks)
+
+        # The snapshot can only be imported while the leading transaction is open
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                (table, export_format): executor.submit(export_snapshot_file, snapshot, table, export_format, json_lines, compress, itersize, delta)
+                for table, delta in deltas.items() for export_format in formats
+            }
+            for (table, export_format), future in futures.items():
+                paths.setdefault(table, {})[export_format] = future.result()
+
+    for table, delta in deltas.items():
+        column, upper = bounds[table]
+        if delta is None:
+            watermarks[table] = {'column': column, 'value': upper, **options, 'deltas': []}
+        else:
+            watermarks[table]['value'] = upper
+            watermarks[table]['deltas'][-1]['complete'] = True
+    save_watermarks(watermarks)
+
+    return paths
+
+
+def remove_delta_files(watermark, deltas=None):
+    """ Removes the files of the deltas listed in a table watermark, all of them by default. """
+
+    if watermark is None:
+        return
+
+    for delta in watermark['deltas'] if deltas is None else deltas:
+        for pattern in delta['files'].values():
+            for path in EXPORT_DIR.glob(pattern):
+                path.unlink(missing_ok=True)
+
+
+def discard_incomplete_deltas(watermarks):
+    """ Removes the deltas of an export run that did not complete, with their files, and saves the watermarks. """
+
+    discarded = False
+    for table, watermark in watermarks.items():
+        incomplete = [delta for delta in watermark['deltas'] if not delta.get('complete', True)]
+        if incomplete:
+            remove_delta_files(watermark, incomplete)
+            watermark['deltas'] = [delta for delta in watermark['deltas'] if delta not in incomplete]
+            discarded = True
+            print(f"Table '{table}' incomplete deltas discarded.")
+
+    if discarded:
+        save_watermarks(watermarks)
+
+
+def compact_csv(base_path, delta_paths, compress):
+    """ Appends the rows of the CSV delta files, without their header, to the base file. """
+
+    tmp_path = base_path.with_name(base_path.name + '.tmp')
+    with open_export(tmp_path, compress) as target:
+        with open_export(base_path, compress, 'r') as source:
+            shutil.copyfileobj(source, target)
+        for delta_path in delta_paths:
+            with open_export(delta_path, compress, 'r') as source:
+                source.readline()
+                shutil.copyfileobj(source, target)
+    os.replace(tmp_path, base_path)
+
+
+def compact_json(base_path, delta_paths, json_lines, compress):
+    """ Appends the records of the JSON Lines delta files to the base file, inside its array
+    unless it is itself JSON Lines. The base file is streamed, never loaded at once. """
+
+    tmp_path = base_path.with_name(base_path.name + '.tmp')
+    with open_export(tmp_path, compress) as target:
+        with open_export(base_path, compress, 'r') as source:
+            if json_lines:
+                shutil.copyfileobj(source, target)
+            else:
+                # Everything but the closing bracket is copied, the last chunk being held back
+                written = 0
+                pending = ''
+                for chunk in iter(lambda: source.read(1024 ** 2), ''):
+                    target.write(pending)
+                    written += len(pending)
+                    pending = chunk
+                pending = pending.rstrip()[:-1]
+                target.write(pending)
+                empty = written + len(pending.rstrip()) <= 1
+
+        for delta_path in delta_paths:
+            with open_export(delta_path, compress, 'r') as source:
+                for line in source:
+                    if json_lines:
+                        target.write(line)
+                    else:
+                        target.write(('' if empty else ', ') + line.rstrip('\n'))
+                        empty = False
+
+        if not json_lines:
+            target.write(']')
+    os.replace(tmp_path, base_path)
+
+
+def compact_parquet(path):
+    """ Rewrites a Parquet dataset, merging its delta files with the base ones in full row groups. """
+
+    dataset = read_parquet_dataset(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    shutil.rmtree(tmp_path, ignore_errors=True)
+
+    write_parquet(dataset, tmp_path, dataset.schema)
+    shutil.rmtree(path)
+    os.replace(tmp_path, path)
+
+
+def compact_exports(tables=EXPORT_TABLES):
+    """ Merges the delta files of each table back into its base files, leaving a single file
+    per format as after a full export. Returns the tables compacted. """
+
+    watermarks = load_watermarks()
+    discard_incomplete_deltas(watermarks)
+    compacted = []
+
+    for table in tables:
+        watermark = watermarks.get(table)
+        if watermark is None or not watermark['deltas']:
+            continue
+
+        compress = watermark['compress']
+        for export_format in watermark['formats']:
+            delta_paths = [pathlib.Path(EXPORT_DIR, delta['files'][export_format]) for delta in watermark['deltas'] if export_format in delta['files']]
+            if export_format == 'csv':
+                compact_csv(export_path(table, 'csv', compress), delta_paths, compress)
+            elif export_format == 'json':
+                json_lines = watermark['json_lines']
+                compact_json(export_path(table, 'jsonl' if json_lines else 'json', compress), delta_paths, json_lines, compress)
+            elif export_format == 'parquet':
+                compact_parquet(pathlib.Path(EXPORT_DIR, f'{table}_dataset'))
+
+        remove_delta_files(watermark)
+        watermark['deltas'] = []
+        save_watermarks(watermarks)
+        compacted.append(table)
+        print(f"Table '{table}' exports compacted.")
+
+    return compacted
+
+
+def get_table_as_records(table):
+    with connection() as db_conn:
         with db_conn.cursor() as cur:
             cur.execute(
-                sql.SQL("SELECT DISTINCT model FROM {}")
-                .format(sql.Identifier(table))
+                sql.SQL("""
+                    SELECT EXISTS (
+                        SELECT FROM information_schema.tables
+                        WHERE table_schema = 'public'
+                        AND table_name = {}
+                    )
+                """)
+                .format(sql.Literal(table))
             )
-            rows = cur.fetchall()
-
-        column_names = [desc[0] for desc in cur.description]
-        data = [dict(zip(column_names, row)) for row in rows]
+            exists = cur.fetchone()[0]
+    
+        if exists:
+            with db_conn.cursor() as cur:
+                cur.execute(
+                    sql.SQL("SELECT DISTINCT model FROM {}")
+                    .format(sql.Identifier(table))
+                )
+                rows = cur.fetchall()
 
-    else:
-        print(f"Table '{table}' does not exist, it can't be exported.")
+            column_names = [desc[0] for desc in cur.description]
+            data = [dict(zip(column_names, row)) for row in rows]
 
-    db_conn.close()
+        else:
+            print(f"Table '{table}' does not exist, it can't be exported.")
 
     return data        
 
@@ -403,110 +1234,7 @@ def drop_table(conn, table):
 def create_specs_tables():
     """ Creates specs tables in Postgres. """
 
-    db_conn = psycopg2.connect(
-        host=HOST,
-        user=USER,
-        password=PASSWORD,
-        port=PORT,
-        database=DATABASE_NAME,
-    )
-
-    # Create the 'cpu_specs' table if it doesn't exist
-    with db_conn.cursor() as cur:
-        cur.execute(f"""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                AND table_name = 'cpu_specs'
-            );
-        """)
-        exists = cur.fetchone()[0]
-
-    if not exists:
-        try:
-            with db_conn.cursor() as cur:
-                cur.execute(f"""
-                    CREATE TABLE cpu_specs (
-                        id SERIAL PRIMARY KEY,
-                        model VARCHAR(40),
-                        process_size_nm NUMERIC,
-                        transistor_count NUMERIC,
-                        die_size_mm2 NUMERIC,
-                        launch_price_usd NUMERIC,
-                        release_date DATE,
-                        core_count NUMERIC,
-                        thread_count NUMERIC,
-                        frequency_ghz NUMERIC,
-                        tdp_w NUMERIC,
-                        foundry VARCHAR(20)
-                    );
-                """)
-                # Add a unique constraint on the model column
-                cur.execute(f"""
-                    CREATE UNIQUE INDEX cpu_specs_model_idx
-                    ON cpu_specs (model);
-                """)
-                db_conn.commit()
-            print(f"Table 'cpu_specs' and its constraints successfully created.")
-        except Exception as e:
-            print("Error creating table 'cpu_specs': {e}")
-            db_conn.rollback()
-    else:
-        print(f"Table 'cpu_specs' and its related constraints already exist.")
-
-
-    # Create the 'gpu_specs' table if it doesn't exist
-    with db_conn.cursor() as cur:
-        cur.execute(f"""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                AND table_name = 'gpu_specs'
-            );
-        """)
-        exists = cur.fetchone()[0]
-
-    if not exists:
-        try:
-            with db_conn.cursor() as cur:
-                cur.execute(f"""
-                    CREATE TABLE gpu_specs (
-                        id SERIAL PRIMARY KEY,
-                        model VARCHAR(30),
-                        architecture VARCHAR(20),
-                        process_size_nm NUMERIC,
-                        transistor_count NUMERIC,
-                        density_m_per_mm2 VARCHAR(120),
-                        die_size_mm2 NUMERIC,
-                        tdp_w NUMERIC,
-                        memory_size_gb NUMERIC,
-                        memory_type VARCHAR(12),
-                        launch_price_usd NUMERIC,
-                        release_date DATE,
-                        tensor_core_count NUMERIC,
-                        pixel_rate_gpixel_per_s NUMERIC,
-                        texture_rate_gtexel_per_s NUMERIC,
-                        fp32_tflops NUMERIC,
-                        base_clock_mhz NUMERIC,
-                        boost_clock_mhz NUMERIC,
-                        foundry VARCHAR(20)
-                    );
-                """)
-                # Add a unique constraint on the model column
-                cur.execute(f"""
-                    CREATE UNIQUE INDEX gpu_specs_model_idx
-                    ON gpu_specs (model);
-                """)
-                db_conn.commit()
-            print(f"Table 'gpu_specs' successfully created.")
-        except Exception as e:
-            print(f"Error creating table 'gpu_specs': {e}")
-            db_conn.rollback()
-    else:
-        print(f"Table 'gpu_specs' and its related constraints already exist.")
-
-    # Close the connection
-    db_conn.close()
+    ensure_schema(('cpu_specs', 'gpu_specs'))
 
 
 def add_data_to_cpu_specs_tb(conn, dict):
@@ -541,9 +1269,76 @@ def add_data_to_gpu_specs_tb(conn, dict):
         for element in dict: print(dict[element])
 
 
+def copy_upsert(conn, df, table, conflict_columns, update=True):
+    """ Streams a dataframe into a table through COPY FROM STDIN.
+    Rows are staged in a temporary table, then inserted into the target table,
+    conflicting rows being updated (or skipped if update is False).
+    NA, 'None' and empty string values are loaded as NULL.
+    Returns the number of inserted or updated rows. """
+
+    columns = list(df.columns)
+    staging = f'{table}_staging'
+
+    # Serializes the whole frame once, missing values becoming unquoted empty CSV fields (NULL)
+    buffer = io.StringIO()
+    df.mask(df.isna() | df.isin(['None', ''])).to_csv(buffer, index=False, header=False, na_rep='')
+    buffer.seek(0)
+
+    column_list = sql.SQL(', ').join(map(sql.Identifier, columns))
+    conflict_list = sql.SQL(', ').join(map(sql.Identifier, conflict_columns))
+
+    if update:
+        on_conflict = sql.SQL("DO UPDATE SET {}").format(
+            sql.SQL(', ').join(
+                sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(column))
+                for column in columns if column not in conflict_columns
+            )
+        )
+    else:
+        on_conflict = sql.SQL("DO NOTHING")
+
+    with conn.cursor() as cur:
+        cur.execute(
+            sql.SQL("""
+                DROP TABLE IF EXISTS pg_temp.{staging};
+                CREATE TEMP TABLE {staging} ON COMMIT DROP AS
+                SELECT {columns} FROM {table} WITH NO DATA;
+            """)
+            .format(staging=sql.Identifier(staging), columns=column_list, table=sql.Identifier(table))
+        )
+        cur.copy_expert(
+            sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)")
+            .format(sql.Identifier(staging), column_list),
+            buffer,
+        )
+        # Keeps the last occurrence of duplicated keys, as successive single-row upserts would
+        cur.execute(
+            sql.SQL("""
+                INSERT INTO {table} ({columns})
+                SELECT DISTINCT ON ({conflict}) {columns}
+                FROM {staging}
+                ORDER BY {conflict}, ctid DESC
+                ON CONFLICT ({conflict}) {on_conflict};
+            """)
+            .format(
+                table=sql.Identifier(table),
+                columns=column_list,
+                conflict=conflict_list,
+                staging=sql.Identifier(staging),
+                on_conflict=on_conflict,
+            )
+        )
+        affected = cur.rowcount
+
+    return affected
+
+
 if __name__ == '__main__':
-    export_table('gpu_prices')
-    export_table('cpu_prices')
-    export_table('gpu_specs')
-    export_table('cpu_specs')
+    # python -m project.sample.db_conn [full | incremental | compact]
+    command = sys.argv[1] if len(sys.argv) > 1 else 'full'
+
+    if command == 'compact':
+        compact_exports()
+    else:
+        export_tables(incremental=command == 'incremental')
     # print('Hello World')
\ No newline at end of file
@@ -0,0 +1,265 @@
+import contextlib
+import gzip
+import hashlib
+import logging
+import os
+import pathlib
+import re
+import sqlite3
+import threading
+import time
+
+ROOT_DIR = pathlib.Path(__file__).resolve().parent
+DATA_DIR = pathlib.Path(ROOT_DIR.parent, 'data')
+
+CACHE_DIR = pathlib.Path(os.environ.get('HTTP_CACHE_DIR', pathlib.Path(DATA_DIR, 'http_cache')))
+# Total size of the compressed bodies kept on disk, least recently used ones being evicted beyond it
+MAX_CACHE_BYTES = int(os.environ.get('HTTP_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+# Replays cached responses only, a missing one raising CacheMiss instead of hitting the network
+OFFLINE = os.environ.get('HTTP_CACHE_OFFLINE', '0') == '1'
+
+# Wayback snapshots, e.g. https://web.archive.org/web/20181023002455/https://www.ldlc.com/..., never change
+SNAPSHOT_PATTERN = re.compile(r'^https?://web\.archive\.org/web/\d{14}')
+
+logger = logging.getLogger(__name__)
+
+
+class CacheMiss(LookupError):
+    """ Raised in offline mode when a response is not cached. """
+
+
+def is_snapshot_url(url):
+    """ Checks if url points to an immutable Wayback snapshot. """
+
+    return SNAPSHOT_PATTERN.match(url) is not None
+
+
+class HttpCache:
+    """
+    On-disk cache of HTTP response bodies, shared by all processes.
+    Bodies are stored gzipped under their sha256 digest, identical snapshots being stored once,
+    and a SQLite index maps each url to its body.
+
+    Attributes:
+        directory (Path): Cache directory.
+        max_bytes (int): Size cap of the stored bodies.
+        offline (bool): Whether misses raise CacheMiss.
+        hits, misses, stores, evictions (int): Counters of this process.
+
+    Methods:
+        get(url, max_age): Returns the cached body of url (bytes), or None.
+        put(url, content): Stores the body of url.
+        stats(): Returns the counters and the cache size.
+        close(): Closes the index.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_CACHE_BYTES, offline=OFFLINE):
+        self.directory = pathlib.Path(directory)
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.hits = self.misses = self.stores = self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+        pathlib.Path(self.directory, 'objects').mkdir(parents=True, exist_ok=True)
+        # Keeps the cache out of version control
+        pathlib.Path(self.directory, '.gitignore').write_text('*\n')
+
+    def _index(self):
+        """ Returns the index connection of the current process, SQLite connections not surviving a fork. """
+
+        if self._pid != os.getpid():
+            self._conn = sqlite3.connect(pathlib.Path(self.directory, 'index.sqlite'), timeout=60, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL;")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    url TEXT PRIMARY KEY,
+                    digest TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    stored_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                );
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest);")
+            # Running size of the stored bodies, shared by all processes and updated along with the entries,
+            # computed from the entries only when the table is created
+            self._conn.execute("CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), size INTEGER NOT NULL);")
+            self._conn.execute("""
+                INSERT OR IGNORE INTO totals (id, size)
+                SELECT 0, COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM entries);
+            """)
+            self._pid = os.getpid()
+
+        return self._conn
+
+    def _object_path(self, digest):
+        return pathlib.Path(self.directory, 'objects', digest[:2], f'{digest}.gz')
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """ Runs index statements atomically, so that the running size matches the entries. """
+
+        index = self._index()
+        index.execute("BEGIN IMMEDIATE;")
+        try:
+            yield index
+        except BaseException:
+            index.execute("ROLLBACK;")
+            raise
+        index.execute("COMMIT;")
+
+    def _release(self, index, digest, size):
+        """ Subtracts a body from the running size once no entry references it, telling if it was released.
+        Its file is only removed by _unlink_unreferenced, once the transaction committed. """
+
+        if index.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1;", (digest,)).fetchone() is None:
+            index.execute("UPDATE totals SET size = size - ? WHERE id = 0;", (size,))
+            return True
+
+        return False
+
+    def _unlink_unreferenced(self, digests):
+        """ Removes the bodies of released digests still unreferenced. The check and the unlink run under the index
+        write lock, so that a put in another process cannot reference a body while it is being removed. """
+
+        if not digests:
+            return
+
+        with self._transaction() as index:
+            for digest in digests:
+                if index.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1;", (digest,)).fetchone() is None:
+                    self._object_path(digest).unlink(missing_ok=True)
+
+    def get(self, url, max_age=None):
+        """ Returns the cached body of url, or None if missing or older than max_age seconds. """
+
+        with self._lock:
+            index = self._index()
+            entry = index.execute("SELECT digest, stored_at, size FROM entries WHERE url = ?;", (url,)).fetchone()
+
+            content = None
+            if entry is not None and (max_age is None or time.time() - entry[1] <= max_age):
+                try:
+                    content = gzip.decompress(self._object_path(entry[0]).read_bytes())
+                    index.execute("UPDATE entries SET accessed_at = ? WHERE url = ?;", (time.time(), url))
+                except (OSError, EOFError):
+                    # Body evicted by another process or truncated
+                    with self._transaction() as index:
+                        index.execute("DELETE FROM entries WHERE url = ?;", (url,))
+                        released = self._release(index, entry[0], entry[2])
+                    if released:
+                        self._unlink_unreferenced([entry[0]])
+
+            if content is None:
+                self.misses += 1
+                logger.debug(f"CACHE :: MISS :: {url}")
+                if self.offline:
+                    raise CacheMiss(url)
+            else:
+                self.hits += 1
+                logger.debug(f"CACHE :: HIT :: {url}")
+
+        return content
+
+    def put(self, url, content):
+        """ Stores the body of url, then evicts the least recently used bodies beyond max_bytes. """
+
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._object_path(digest)
+
+        with self._lock:
+            # Bodies are compressed outside the index transaction, then moved in place within it,
+            # so that the file, its entry and the running size change together for other processes
+            tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+            if not path.exists():
+                path.parent.mkdir(exist_ok=True)
+                tmp_path.write_bytes(gzip.compress(content, compresslevel=6))
+
+            now = time.time()
+            released = []
+            with self._transaction() as index:
+                if tmp_path.exists():
+                    os.replace(tmp_path, path)
+                elif not path.exists():
+                    # Evicted by another process since the check
+                    path.parent.mkdir(exist_ok=True)
+                    path.write_bytes(gzip.compress(content, compresslevel=6))
+                size = path.stat().st_size
+
+                previous = index.execute("SELECT digest, size FROM entries WHERE url = ?;", (url,)).fetchone()
+                if index.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1;", (digest,)).fetchone() is None:
+                    index.execute("UPDATE totals SET size = size + ? WHERE id = 0;", (size,))
+                index.execute(
+                    "INSERT OR REPLACE INTO entries (url, digest, size, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?);",
+                    (url, digest, size, now, now)
+                )
+                if previous is not None and previous[0] != digest and self._release(index, *previous):
+                    released.append(previous[0])
+                total = self._size()
+            self._unlink_unreferenced(released)
+            self.stores += 1
+
+            if total > self.max_bytes:
+                self._evict()
+
+    def _size(self):
+        return self._index().execute("SELECT size FROM totals WHERE id = 0;").fetchone()[0]
+
+    def _evict(self):
+        """ Removes least recently used entries, and their bodies once unreferenced, until under max_bytes. """
+
+        size = self._size()
+
+        while size > self.max_bytes:
+            released = []
+            with self._transaction() as index:
+                oldest = index.execute("SELECT url, digest, size FROM entries ORDER BY accessed_at LIMIT 100;").fetchall()
+                for url, digest, entry_size in oldest:
+                    index.execute("DELETE FROM entries WHERE url = ?;", (url,))
+                    if self._release(index, digest, entry_size):
+                        released.append(digest)
+                    self.evictions += 1
+                size = self._size()
+            # Bodies are only removed once their entries are deleted for good
+            self._unlink_unreferenced(released)
+
+            if not oldest:
+                break
+
+    def stats(self):
+        with self._lock:
+            size = self._size()
+        lookups = self.hits + self.misses
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+            'stores': self.stores,
+            'evictions': self.evictions,
+            'size_mb': round(size / 1024 ** 2, 1),
+        }
+
+    def close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+        self._pid = None
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """ Returns the cache of the current process, creating it on first use. """
+
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = HttpCache()
+
+        return _cache
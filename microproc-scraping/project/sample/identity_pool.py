@@ -0,0 +1,266 @@
+import json
+import logging
+import pathlib
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+from fake_useragent import UserAgent
+
+ROOT_DIR = pathlib.Path(__file__).resolve().parent
+DATA_DIR = pathlib.Path(ROOT_DIR.parent, 'data')
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/107.0.0.0 Safari/537.36 OPR/93.0.0.0'
+# Older user-agents from the fake_useragent data would stand out more than they help
+MIN_CHROME_VERSION = 100
+
+# Seconds before a request is given up, and pause before retrying through the direct connection
+REQUEST_TIMEOUT = 60
+RETRY_DELAY = 10
+# Statuses telling that the proxy or the user-agent is refused
+BLOCKED_STATUSES = {403, 407, 429}
+
+# Identities using the direct connection, only handed out once no proxy is left
+DIRECT_IDENTITIES = 3
+
+# Weight of the last request in the latency moving average
+LATENCY_SMOOTHING = 0.3
+# A proxy is evicted after this many errors in a row, or above MAX_ERROR_RATE once it served MIN_REQUESTS
+MAX_CONSECUTIVE_ERRORS = 3
+MAX_ERROR_RATE = 0.5
+MIN_REQUESTS = 5
+# Weight floor keeping failing proxies drawable until they are evicted
+MIN_WEIGHT = 0.01
+
+logger = logging.getLogger(__name__)
+
+
+def load_proxies(file_name='proxies'):
+    """ Loads the pool of validated proxies which did not expire yet, best scores first. """
+
+    json_path = pathlib.Path(DATA_DIR, f"{file_name}.json")
+    if not json_path.is_file():
+        return []
+
+    with json_path.open("r", encoding="UTF-8") as source:
+        proxies = json.load(source)
+
+    # Entries without an expiry date come from unvalidated harvests
+    now = datetime.now(timezone.utc)
+    proxies = [proxy for proxy in proxies if 'expires_at' in proxy and datetime.fromisoformat(proxy['expires_at']) > now]
+
+    return sorted(proxies, key=lambda proxy: proxy['score'], reverse=True)
+
+
+def get_user_agents():
+    """ Returns the recent Chrome user-agents known by fake_useragent, Playwright running Chromium. """
+
+    try:
+        candidates = UserAgent().data_browsers['chrome']
+    except Exception:
+        candidates = []
+
+    user_agents = [USER_AGENT]
+    for user_agent in candidates:
+        version = re.search(r'Chrome/(\d+)\.', user_agent)
+        if version is not None and int(version.group(1)) >= MIN_CHROME_VERSION and user_agent not in user_agents:
+            user_agents.append(user_agent)
+
+    return user_agents
+
+
+class Identity:
+    """
+    A proxy and the user-agent always sent through it, with its recent health.
+
+    Attributes:
+        proxy (dict): Proxy entry from proxies.json, None for the direct connection.
+        user_agent (str): User-agent sent by every client of the identity.
+        latency (float): Moving average of the request durations, in seconds.
+        requests (int): Number of reported requests.
+        errors (int): Number of reported errors.
+        consecutive_errors (int): Number of errors since the last success.
+        evicted (bool): Whether the pool stopped handing out the identity.
+
+    Methods:
+        proxy_url(): Returns the proxy url, None for the direct connection.
+        requests_proxies(): Returns the proxies argument of requests.
+        playwright_proxy(): Returns the proxy argument of Playwright browser.new_context.
+        session(): Returns the requests session of the identity.
+        score(): Returns the identity score, reliable and fast ones scoring highest.
+    """
+
+    def __init__(self, proxy, user_agent):
+        self.proxy = proxy
+        self.user_agent = user_agent
+        self.latency = proxy.get('latency') if proxy is not None else None
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.evicted = False
+        self._session = None
+
+    def __repr__(self):
+        return f"Identity({self.proxy_url() or 'direct'})"
+
+    def proxy_url(self):
+        if self.proxy is None:
+            return None
+
+        return f"http://{self.proxy['ip']}:{self.proxy['port']}"
+
+    def requests_proxies(self):
+        if self.proxy is None:
+            return None
+
+        return {'http': self.proxy_url(), 'https': self.proxy_url()}
+
+    def playwright_proxy(self):
+        # Overrides the placeholder proxy the browser is launched with when the pool has proxies
+        if self.proxy is None:
+            return {'server': 'direct://'}
+
+        return {'server': self.proxy_url()}
+
+    def session(self):
+        if self._session is None:
+            self._session = requests.Session()
+            self._session.headers['User-agent'] = self.user_agent
+            if self.proxy is not None:
+                self._session.proxies.update(self.requests_proxies())
+
+        return self._session
+
+    def score(self):
+        # Proxies keep the success rate measured by proxy_retriever until they served requests
+        if self.requests:
+            success_rate = 1 - self.errors / self.requests
+        elif self.proxy is not None:
+            success_rate = self.proxy.get('success_rate', 1)
+        else:
+            success_rate = 1
+
+        return success_rate / (1 + (self.latency or 0))
+
+
+class IdentityPool:
+    """
+    Thread-safe pool of identities rotated across requests sessions, aiohttp requests and Playwright contexts.
+    Proxies are picked at random weighted by their score, and evicted once unhealthy.
+
+    Attributes:
+        identities (list): Proxy identities, evicted ones included.
+        direct (list): Identities using the direct connection.
+
+    Methods:
+        acquire(): Returns an identity.
+        report(identity, ok, latency): Records the outcome of a request made with an identity.
+        has_proxies(): Tells if some proxy identities are still healthy.
+        stats(): Returns the pool counters.
+    """
+
+    def __init__(self, proxies=None, direct_identities=DIRECT_IDENTITIES):
+        proxies = load_proxies() if proxies is None else proxies
+        user_agents = get_user_agents()
+
+        self.identities = [Identity(proxy, random.choice(user_agents)) for proxy in proxies]
+        self.direct = [Identity(None, user_agent) for user_agent in random.sample(user_agents, min(direct_identities, len(user_agents)))]
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            healthy = [identity for identity in self.identities if not identity.evicted]
+            if not healthy:
+                return random.choice(self.direct)
+
+            return random.choices(healthy, weights=[max(identity.score(), MIN_WEIGHT) for identity in healthy])[0]
+
+    def report(self, identity, ok, latency=None):
+        with self._lock:
+            identity.requests += 1
+            if ok:
+                identity.consecutive_errors = 0
+                if latency is not None:
+                    identity.latency = latency if identity.latency is None else (1 - LATENCY_SMOOTHING) * identity.latency + LATENCY_SMOOTHING * latency
+            else:
+                identity.errors += 1
+                identity.consecutive_errors += 1
+
+            # The direct connection is never evicted, being the last resort
+            if identity.proxy is None or identity.evicted:
+                return
+
+            if identity.consecutive_errors >= MAX_CONSECUTIVE_ERRORS or (identity.requests >= MIN_REQUESTS and identity.errors / identity.requests > MAX_ERROR_RATE):
+                identity.evicted = True
+                logger.warning(f"IDENTITY :: EVICTED :: {identity!r}, {identity.errors}/{identity.requests} errors")
+
+    def has_proxies(self):
+        with self._lock:
+            return any(not identity.evicted for identity in self.identities)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'proxies': len(self.identities),
+                'evicted': sum(identity.evicted for identity in self.identities),
+                'requests': sum(identity.requests for identity in self.identities + self.direct),
+                'errors': sum(identity.errors for identity in self.identities + self.direct),
+            }
+
+
+def is_healthy_status(status):
+    """ Tells if a response status means that the identity was served. """
+
+    return status not in BLOCKED_STATUSES and status < 500
+
+
+def launch_options(pool):
+    """ Returns the Playwright launch arguments needed for per-context proxies.
+    Chromium on Windows only applies them if the browser is launched with a proxy. """
+
+    if pool.has_proxies():
+        return {'proxy': {'server': 'http://per-context'}}
+
+    return {}
+
+
+def get(url, pool=None, timeout=REQUEST_TIMEOUT):
+    """ Sends a GET request with an identity of the pool, retrying with another identity on connection errors. """
+
+    pool = get_pool() if pool is None else pool
+
+    while True:
+        identity = pool.acquire()
+        start = time.perf_counter()
+        try:
+            response = identity.session().get(url, timeout=timeout)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            pool.report(identity, ok=False)
+            logger.warning(f"IDENTITY :: RETRY :: {identity!r}, {url}, {e!r}")
+            # Another proxy can be tried right away, the direct connection needs some rest
+            if identity.proxy is None:
+                time.sleep(RETRY_DELAY)
+            continue
+
+        pool.report(identity, ok=is_healthy_status(response.status_code), latency=time.perf_counter() - start)
+
+        return response
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """ Returns the identity pool of the current process, loading proxies.json on first use. """
+
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = IdentityPool()
+
+        return _pool
@@ -1,17 +1,26 @@
+import asyncio
 import json
 import logging
 import multiprocessing
-import operator
 import pathlib
+import queue
 import re
+import threading
 import time
 from datetime import datetime
+from functools import lru_cache
+from urllib.parse import urlencode
 
+import aiohttp
+import numpy
 import pandas
 import psycopg2
-import requests
-from bs4 import BeautifulSoup
+import soupsieve
+from bs4 import BeautifulSoup, SoupStrainer
 import project.sample.db_conn as dbc
+import project.sample.http_cache as http_cache
+import project.sample.identity_pool as identity_pool
+from project.sample.async_fetcher import AsyncFetcher
 
 ROOT_DIR = pathlib.Path(__file__).resolve().parent
 DATA_DIR = pathlib.Path(ROOT_DIR.parent, 'data')
@@ -31,6 +40,41 @@ TARGETS = [
     }
 ]
 
+CDX_ENDPOINT = 'http://web.archive.org/cdx/search/cdx'
+CDX_FIELDS = ['timestamp', 'original', 'length']
+# Successful HTML captures only, adjacent identical captures (same digest, hence same length) being collapsed
+CDX_FILTERS = ['statuscode:200', 'mimetype:text/html']
+CDX_COLLAPSE = 'digest'
+# Captures per CDX request, the following ones being requested with the returned resume key
+CDX_PAGE_SIZE = 10000
+CDX_SEPARATOR_PATTERN = re.compile(r'[\s,]*')
+
+# CDX listings grow with new snapshots, their cached copy being refetched after a day
+CDX_MAX_AGE = 24 * 3600
+
+# Maximum number of archived snapshots scraped concurrently, split between the WORKERS processes
+URL_CONCURRENCY = 100
+
+# Maximum number of pages of one snapshot fetched concurrently
+PAGE_CONCURRENCY = 8
+
+# Scraping processes, and URL rows queued ahead of them, the producer blocking beyond it
+WORKERS = multiprocessing.cpu_count()
+QUEUE_SIZE = 4 * WORKERS
+
+# Attempts per URL on database and network errors, the delay growing with each attempt
+MAX_URL_ATTEMPTS = 3
+URL_RETRY_DELAY = 30
+RETRYABLE_ERRORS = (psycopg2.OperationalError, aiohttp.ClientError, asyncio.TimeoutError)
+
+# Seconds between two progress logs
+PROGRESS_INTERVAL = 30
+
+# BeautifulSoup tree builder used for archived pages, 'lxml' being several times faster than 'html.parser'
+PARSER = 'lxml'
+# Restricts the tree to the articles and pagination nodes, the rest of the page being skipped while parsing
+STRAIN_PAGES = True
+
 """ LOGGER CONFIGURATION """
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -46,6 +90,7 @@ stream_handler.setFormatter(formatter)
 logger.addHandler(stream_handler)
 
 
+@lru_cache(maxsize=None)
 def is_before_update(date):
     """ Checks if date is before update or not. """
 
@@ -63,32 +108,163 @@ def get_iso_date(timestamp):
     return iso_date
 
 
+def get_content(url, max_age=None):
+    """ Gets response body from url, going through the on-disk cache for snapshots
+    or when max_age (seconds) is given. """
+
+    cache = http_cache.get_cache()
+    cacheable = max_age is not None or http_cache.is_snapshot_url(url)
+
+    if cacheable:
+        # Stale entries are still replayed when offline
+        content = cache.get(url, max_age=None if cache.offline else max_age)
+        if content is not None:
+            return content
+
+    response = identity_pool.get(url)
+
+    if cacheable and response.status_code == 200:
+        cache.put(url, response.content)
+
+    return response.content
+
+
 def get_soup(url):
     """ Gets soup from url. """
 
-    headers = {'User-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/107.0.0.0 Safari/537.36 OPR/93.0.0.0'}
+    return BeautifulSoup(get_content(url), PARSER)
+
+
+# Classes of the pagination lists, in both pre- and post-2019-02 layouts
+PAGINATION_CLASSES = {'pagerItems', 'pagination', 'pagerUnitItems'}
+
+
+def is_listing_node(name, attrs):
+    """ Tells if a tag holds an article or the pagination, to be kept by the SoupStrainer. """
+
+    classes = attrs.get('class') or ''
+    if not isinstance(classes, str):
+        classes = ' '.join(classes)
+
+    if name == 'tr':
+        return 'cmp' in classes
+    if name == 'li':
+        return 'pdt-item' in classes.split()
+    if name == 'ul':
+        return not PAGINATION_CLASSES.isdisjoint(classes.split())
+
+    return False
+
+
+LISTING_STRAINER = SoupStrainer(is_listing_node)
+
+
+def make_soup(content, parser=None, strain=None):
+    """ Parses a page raw content with the configured backend, optionally restricted to the listing nodes. """
+
+    parser = PARSER if parser is None else parser
+    strain = STRAIN_PAGES if strain is None else strain
+
+    return BeautifulSoup(content, parser, parse_only=LISTING_STRAINER if strain else None)
+
+
+def parse_page(content):
+    """ Gets soup and script-embedded prices from a page raw content. """
+
+    return make_soup(content), extract_page_prices(content)
 
-    while True:
-        try:
-            response = requests.get(url, headers=headers)
-            break
-        except requests.exceptions.ConnectionError:
-            print("requests.exceptions.ConnectionError")
-            time.sleep(10)
 
-    return BeautifulSoup(response.content, 'html.parser')
+async def get_page_async(fetcher, url):
+    """ Gets soup and script-embedded prices from url using the shared asynchronous fetcher. """
 
+    content = await fetcher.fetch(url)
 
-def get_archive_urls(src_url):
-    """ Retrieves urls to be scraped using web.archive API. """
+    return parse_page(content)
 
-    webarchive_cdx = f'http://web.archive.org/cdx/search/cdx?url={src_url}&output=json'
 
-    headers = {'User-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/107.0.0.0 Safari/537.36 OPR/93.0.0.0'}
-    page = requests.get(webarchive_cdx, headers=headers)
-    soup = json.loads(str(BeautifulSoup(page.content, 'html.parser')))
+async def get_page_bounded(fetcher, url, semaphore):
+    """ Gets soup and script-embedded prices from url, waiting for the semaphore. """
 
-    df = pandas.DataFrame(soup[1:], columns=soup[0])
+    async with semaphore:
+        return await get_page_async(fetcher, url)
+
+
+def get_page_url(page_item):
+    """ Returns the absolute url of a pagination item. """
+
+    page_url = page_item.find('a').get('href')
+    if page_url[:4] != 'http':
+        page_url = 'https://web.archive.org' + page_url
+
+    return page_url
+
+
+def iter_cdx_rows(content):
+    """ Yields the rows of a CDX JSON array one at a time, without decoding the whole array. """
+
+    text = content.decode('utf-8', errors='replace')
+    decoder = json.JSONDecoder()
+
+    position = text.find('[') + 1
+    if position == 0:
+        return
+
+    while True:
+        position = CDX_SEPARATOR_PATTERN.match(text, position).end()
+        if position >= len(text) or text[position] == ']':
+            return
+        row, position = decoder.raw_decode(text, position)
+        yield row
+
+
+def get_archive_urls(src_url, from_date=None, to_date=None):
+    """ Retrieves urls to be scraped using web.archive API, page by page through resume keys.
+    Only the longest capture of each day (the first one on ties) is kept while reading. """
+
+    params = [
+        ('url', src_url),
+        ('output', 'json'),
+        ('fl', ','.join(CDX_FIELDS)),
+        ('collapse', CDX_COLLAPSE),
+        ('limit', CDX_PAGE_SIZE),
+        ('showResumeKey', 'true'),
+    ]
+    params += [('filter', cdx_filter) for cdx_filter in CDX_FILTERS]
+    if from_date is not None:
+        params.append(('from', f'{from_date:%Y%m%d}'))
+    if to_date is not None:
+        params.append(('to', f'{to_date:%Y%m%d}'))
+
+    captures = {}
+    resume_key = None
+
+    while True:
+        page_params = params + ([('resumeKey', resume_key)] if resume_key is not None else [])
+        content = get_content(f'{CDX_ENDPOINT}?{urlencode(page_params)}', max_age=CDX_MAX_AGE)
+
+        # Rows are followed by an empty row and the resume key when more captures remain
+        resume_key = None
+        is_last_row = False
+        for row in iter_cdx_rows(content):
+            if is_last_row:
+                resume_key = row[0]
+                break
+            if not row:
+                is_last_row = True
+                continue
+            if row == CDX_FIELDS:
+                continue
+
+            capture = dict(zip(CDX_FIELDS, row))
+            capture['length'] = int(capture['length']) if capture['length'].isdigit() else 0
+            day = capture['timestamp'][:8]
+            if day not in captures or capture['length'] > captures[day]['length']:
+                captures[day] = capture
+
+        if resume_key is None:
+            break
+
+    df = pandas.DataFrame(list(captures.values()), columns=CDX_FIELDS)
 
     return df
 
@@ -97,52 +273,58 @@ def process_df(df, target):
     """ Takes the df containing all URLs to be scraped, adapts it,
     and filters it out to remove already processed URLs. """
 
-    df['date'] = df['timestamp'].apply(lambda x: str(x)[:4]+"-"+str(x)[4:6]+"-"+str(x)[6:8])
-    df['category'] = target['category']
-    df['url'] = df.apply(lambda row: f'https://web.archive.org/web/{row["timestamp"]}/{row["original"]}', axis=1)
-    df['length'] = df['length'].astype(int)
-
-    # Filters out duplicates for dates and keeps only entries for which 'length' is maximum
-    idx = df.groupby('date')['length'].idxmax()
-    df = df.loc[idx]
+    df = df.assign(length=df['length'].astype(int))
+
+    # Filters out duplicates for dates and keeps only entries for which 'length' is maximum, the first one on ties.
+    # Captures are sorted by integer day, decreasing length and position, so that strings are only built for the kept entries
+    day = df['timestamp'].astype('int64').to_numpy() // 1_000_000
+    order = numpy.lexsort((numpy.arange(len(df)), -df['length'].to_numpy(), day))
+    is_first = numpy.ones(len(order), dtype=bool)
+    is_first[1:] = day[order][1:] != day[order][:-1]
+    df = df.iloc[order[is_first]]
+
+    # New columns are assigned to a new frame, df being a selection of the captures
+    timestamp = df['timestamp'].astype(str)
+    df = df.assign(
+        date=timestamp.str[:4] + "-" + timestamp.str[4:6] + "-" + timestamp.str[6:8],
+        category=target['category'],
+        url='https://web.archive.org/web/' + timestamp + '/' + df['original'].astype(str),
+    )
 
-    # Retrieves all fully processed URLs from database and removes corresponding entries from daataframe
-    proc_url = dbc.get_proc_url()
-    proc_url = [(row[0], row[1].strftime('%Y-%m-%d')) for row in proc_url]
-    df = df[~df[['category', 'date']].apply(tuple, axis=1).isin(proc_url)]
+    # Retrieves all fully processed URLs from database and removes corresponding entries from dataframe,
+    # with a hash join on (category, date) rather than comparing tuples row by row
+    proc_url = pandas.DataFrame(list(dbc.get_proc_url()), columns=['category', 'date'])
+    proc_url['date'] = pandas.to_datetime(proc_url['date']).dt.strftime('%Y-%m-%d')
+    merged = df[['category', 'date']].merge(proc_url, on=['category', 'date'], how='left', indicator=True)
+    df = df[(merged['_merge'] == 'left_only').to_numpy()]
 
-    # Resets index, very important for chunking to work
+    # Resets index
     df = df.reset_index()
 
     return df
 
 
-def extract_page_prices(soup):
-    """ Extracts prices data from HTML patterns using regex. """
-    
-    page_prices = []
+# Script lines replacing a product price, e.g. $("#pdt-AR201905300077 .price").replaceWith('<div class="price"><div class="price">199<sup>&euro;95</sup></div></div>');
+PRICE_TRAIL_PATTERN = re.compile(rb"""\$\("#pdt-(\D{2}\d{12}) \.price"\)\.replaceWith\('<div class="price"><div class="price">(.+?)<sup>(.*?)</sup></div></div>'\);""")
+DIGITS_PATTERN = re.compile(rb'\d+')
 
-    try:
-        price_trails = re.findall(r'''\$\("#pdt-\D{2}\d{12} \.price"\)\.replaceWith\('<div class="price"><div class="price">.+<\/sup><\/div><\/div>'\);''', str(soup))
-
-        for trail in price_trails:
-            product_id = re.search(r'#pdt-(\D{2}\d{12}?)', trail).group(1)
-            price_info = re.search(r'<div class="price"><div class="price">(.+?)<\/sup>', trail).group(1).split('<sup>')
-            integral = ''.join(re.findall(r'\d+', price_info[0]))
-            fractional = ''.join(re.findall(r'\d+', price_info[1]))
-            product_price = float(integral + '.' + fractional)
-
-            page_prices.append(
-                {
-                    "product_id": product_id,
-                    "product_price": product_price
-                }
-            )
-        
-        return page_prices
 
-    except:
-        return page_prices
+def extract_page_prices(content):
+    """ Extracts prices from the page scripts, in a single regex pass over the raw content.
+    Returns a dictionary of prices (float) keyed by product_id. """
+
+    page_prices = {}
+
+    for product_id, integral, fractional in PRICE_TRAIL_PATTERN.findall(content):
+        try:
+            product_price = float(b''.join(DIGITS_PATTERN.findall(integral)) + b'.' + b''.join(DIGITS_PATTERN.findall(fractional)))
+        except ValueError:
+            continue
+
+        # Keeps the first price of a product, as the former linear lookup did
+        page_prices.setdefault(product_id.decode(errors='replace'), product_price)
+
+    return page_prices
 
 
 def price_from_string(str):
@@ -159,6 +341,29 @@ def price_from_string(str):
     return price
 
 
+# Product selectors, compiled once for all articles
+SKU_SELECTOR = soupsieve.compile('td[class="designation"] > a[class="seemore"]')
+TITLE_SELECTORS = [
+    soupsieve.compile('td[class="designation"] > a'),
+    soupsieve.compile('div[class="pdt-info"] > h3[class="title-3"] > a'),
+    soupsieve.compile('div[class="dsp-cell-right"] > div > div > h3[class="title-3"]')
+]
+INFO_SELECTORS = [
+    soupsieve.compile('td[class="designation"] > span'),
+    soupsieve.compile('td[class="designation"] > div[class="caract"] > span')
+]
+DESC_SELECTORS = [
+    soupsieve.compile('div[class="pdt-info"] > p[class="desc"]'),
+    soupsieve.compile('div[class="dsp-cell-right"] > div > div > p[class="desc"]')
+]
+OLD_PRICE_SELECTOR = soupsieve.compile('td[class="prix"] > span[class="price"]')
+NEW_PRICE_SELECTOR = soupsieve.compile('div[class="basket"] > div[class="price"] > div[class="price"]')
+ARTICLES_SELECTORS = [
+    soupsieve.compile('tr[class*="cmp"]:not([class*="group"])'),
+    soupsieve.compile('li[class="pdt-item"]')
+]
+
+
 class Product:
     """
     Class to manage Product objects scraped from URL. 
@@ -173,41 +378,49 @@ class Product:
         price (float): Product price.
     
     Methods:
+        select_one(html, selector): Returns the first node matching a compiled selector, evaluated once per article.
         get_sku(html): Retrieves sku (str) from HTML.
         get_title(html): Retrieves title (str) from HTML.
         get_info(html): Retrieves desc (str) and model (str) from HTML.
-        get_price(html): Retrieves price (float) from HTML.
+        get_price(html, page_prices): Retrieves price (float) from HTML or from the page prices mapping.
         to_dict(): Returns a dictionary with all attributes.
     """
 
+    def select_one(self, html, selector):
+        if selector not in self._nodes:
+            self._nodes[selector] = selector.select_one(html)
+
+        return self._nodes[selector]
+
     def get_sku(self, html):
-        if html.select_one('td[class="designation"] > a[class="seemore"]'):
-            sku_info = html.select_one('td[class="designation"] > a[class="seemore"]').get('href')
-            sku = re.search(r'(\D{2}\d{12}?)', sku_info).group(1)
+        sku_node = self.select_one(html, SKU_SELECTOR)
+        if sku_node is not None:
+            sku = re.search(r'(\D{2}\d{12}?)', sku_node.get('href')).group(1)
         else:
             sku = html['data-id']
         
         return sku
 
     def get_title(self, html):
-        if html.select_one('td[class="designation"] > a') is not None:
-            title = html.select_one('td[class="designation"] > a').get_text(strip=True)
-        elif html.select_one('div[class="pdt-info"] > h3[class="title-3"] > a') is not None:
-            title = html.select_one('div[class="pdt-info"] > h3[class="title-3"] > a').get_text(strip=True) # .get('title') || .text.strip()
-        elif html.select_one('div[class="dsp-cell-right"] > div > div > h3[class="title-3"]') is not None:
-            title = html.select_one('div[class="dsp-cell-right"] > div > div > h3[class="title-3"]').get_text(strip=True)
+        for selector in TITLE_SELECTORS:
+            title_node = self.select_one(html, selector)
+            if title_node is not None:
+                title = title_node.get_text(strip=True) # .get('title') || .text.strip()
+                break
         
         return title[:120]
 
     def get_info(self, html):
-        if html.select_one('td[class="designation"] > span') is not None:
-            html_info = html.select_one('td[class="designation"] > span').get_text(strip=True)
-        elif html.select_one('td[class="designation"] > div[class="caract"] > span') is not None:
-            html_info = html.select_one('td[class="designation"] > div[class="caract"] > span').get_text(strip=True)
-        if html.select_one('div[class="pdt-info"] > h3[class="title-3"] > a') is not None:
-            html_info = html.select_one('div[class="pdt-info"] > p[class="desc"]').get_text(strip=True)
-        elif html.select_one('div[class="dsp-cell-right"] > div > div > h3[class="title-3"]') is not None:
-            html_info = html.select_one('div[class="dsp-cell-right"] > div > div > p[class="desc"]').get_text(strip=True)
+        for selector in INFO_SELECTORS:
+            info_node = self.select_one(html, selector)
+            if info_node is not None:
+                html_info = info_node.get_text(strip=True)
+                break
+        # Post-2019-02 layouts hold the description next to the title
+        for title_selector, desc_selector in zip(TITLE_SELECTORS[1:], DESC_SELECTORS):
+            if self.select_one(html, title_selector) is not None:
+                html_info = self.select_one(html, desc_selector).get_text(strip=True)
+                break
             
         desc = re.sub(r'\([^()]*\)', '', html_info).strip()
         try:
@@ -220,25 +433,22 @@ class Product:
 
     def get_price(self, html, page_prices):
         if is_before_update(self.date):
-            if html.select_one('td[class="prix"] > span[class="price"]') is not None:
-                price_info = html.select_one('td[class="prix"] > span[class="price"]').prettify().split('<sup>')
+            price_node = self.select_one(html, OLD_PRICE_SELECTOR)
+            if price_node is not None:
+                price_info = price_node.prettify().split('<sup>')
                 price = price_from_string(price_info)
             
             else:
                 price = None
 
         else:
-            if html.select_one('div[class="basket"] > div[class="price"] > div[class="price"]') is not None:
-                price_info = html.select_one('div[class="basket"] > div[class="price"] > div[class="price"]').get_text(strip=True)
+            price_node = self.select_one(html, NEW_PRICE_SELECTOR)
+            if price_node is not None:
+                price_info = price_node.prettify().split('<sup>')
                 price = price_from_string(price_info)
 
             else: # Meaning price is in the script part of the HTML
-                id = html.get('data-id')
-                try:
-                    index = list(map(operator.itemgetter("product_id"), page_prices)).index(id)
-                    price = page_prices[index]["product_price"]
-                except ValueError:
-                    price = None
+                price = page_prices.get(html.get('data-id'))
         
         return price
 
@@ -256,6 +466,7 @@ class Product:
         return dict
 
     def __init__(self, html, row, page_prices):
+        self._nodes = {}
         self.category = row['category']
         self.date = row['date']
         self.sku = self.get_sku(html)
@@ -267,10 +478,11 @@ class Product:
 def get_page_articles(soup):
     """ Returns a list of articles from HTML code. """
 
-    if soup.select('tr[class*="cmp"]:not([class*="group"])'):
-        articles = soup.select('tr[class*="cmp"]:not([class*="group"])')
-    elif soup.select('li[class="pdt-item"]'):
-        articles = soup.select('li[class="pdt-item"]')
+    for selector in ARTICLES_SELECTORS:
+        selected = selector.select(soup)
+        if selected:
+            articles = selected
+            break
     return articles
 
 
@@ -292,19 +504,22 @@ def get_page_navigation(soup):
     return pagination, num_pages
 
 
-def scrape_url(row, db_conn):
-    """ Scrapes a URL and add all its products data into database. """
+async def scrape_url(row, fetcher):
+    """ Scrapes a URL and add all its products data into database.
+    Returns the number of products written, None if the URL could not be fetched. """
 
     # Gets the soup
     try:
-        soup = get_soup(row["url"])
-    except requests.exceptions.InvalidSchema:
+        soup, page_prices = await get_page_async(fetcher, row["url"])
+    except aiohttp.InvalidURL:
         logger.exception(f'URL :: ERROR :: {row["url"]}, invalid schema')
         return
+    except http_cache.CacheMiss:
+        logger.error(f'URL :: ERROR :: {row["url"]}, not cached')
+        return
 
     is_all_scraped = True
-
-    articles = get_page_articles(soup)
+    pages = []
 
     try:
         pagination, num_pages = get_page_navigation(soup)
@@ -312,41 +527,60 @@ def scrape_url(row, db_conn):
         logger.exception(f'URL :: ERROR :: {row["url"]}, {e}')
         return
 
-    # Loops through pages
-    for i in range(1, num_pages + 1):
-        if i != 1:
-            new_url = pagination[i-1].find('a').get('href')
-            if new_url[:4] != 'http':
-                new_url = 'https://web.archive.org' + new_url
-            try:
-                soup = get_soup(new_url)
-            except requests.exceptions.InvalidSchema:
-                logger.exception(f'PAGE :: ERROR :: url:{row["url"]}, page: {i}')
-                is_all_scraped = False
-                continue
+    # Pages 2..N only depend on the pagination of page 1, so they are fetched concurrently
+    page_urls = [get_page_url(pagination[i-1]) for i in range(2, num_pages + 1)]
+    fan_out = asyncio.Semaphore(PAGE_CONCURRENCY)
+    results = await asyncio.gather(*(get_page_bounded(fetcher, url, fan_out) for url in page_urls), return_exceptions=True)
 
-            articles = get_page_articles(soup)
-        
-        page_prices = extract_page_prices(soup)
+    # Loops through pages, in order
+    for i, result in enumerate([(soup, page_prices)] + results, start=1):
+        if isinstance(result, (aiohttp.InvalidURL, http_cache.CacheMiss)):
+            logger.error(f'PAGE :: ERROR :: url:{row["url"]}, page: {i}', exc_info=result)
+            is_all_scraped = False
+            continue
+        elif isinstance(result, BaseException):
+            raise result
+
+        soup, page_prices = result
+        articles = get_page_articles(soup)
+
+        page_products = []
 
         # Loops through articles
         for index, article in enumerate(articles):
             try:
                 product = Product(article, row, page_prices)
-                # Checks if product entry already in database
-                if dbc.is_prod_proc(conn=db_conn, date=product.date, sku=product.sku):
-                    logger.info(f"PRODUCT :: {product.sku} already processed")
-                    continue
-                else:
-                    dbc.add_data_to_products_tb(conn=db_conn, dict=product.to_dict())
-                    logger.info(f"PRODUCT :: {product.to_dict()}")
+                page_products.append(product.to_dict())
             except Exception as e:
                 logger.exception(f'PRODUCT :: ERROR :: url:{row["url"]}, page: {i}, index: {index}, {e}')
                 is_all_scraped = False
-    
-    # Marks the URL as fully scraped if all products processed
-    if is_all_scraped:
-        dbc.update_url_row(db_conn, row)
+
+        pages.append((i, page_products))
+
+    # Borrows a connection only once the snapshot is parsed, so that none is held while awaiting the network
+    with dbc.connection() as db_conn:
+        writer = dbc.ProductWriter(db_conn)
+
+        for i, page_products in pages:
+            for product_dict in page_products:
+                writer.add(product_dict)
+
+            # Writes the whole page in one round trip, already processed products being skipped
+            failed = writer.failed
+            inserted = writer.flush()
+            if writer.failed > failed:
+                logger.error(f'PAGE :: ERROR :: url:{row["url"]}, page: {i}, products could not be written')
+                is_all_scraped = False
+            else:
+                logger.info(f'PAGE :: url:{row["url"]}, page: {i}, {inserted} products written')
+
+        logger.info(f'URL :: {row["url"]}, {writer.stats()}')
+
+        # Marks the URL as fully scraped if all products processed
+        if is_all_scraped:
+            dbc.update_url_row(db_conn, row)
+
+    return writer.written
 
 
 def test():
@@ -357,14 +591,6 @@ def test():
     except Exception as e:
         logger.exception(f'ERROR :: {e}')
 
-    db_conn = psycopg2.connect(
-            host=dbc.HOST,
-            user=dbc.USER,
-            password=dbc.PASSWORD,
-            port=dbc.PORT,
-            database=dbc.DATABASE_NAME,
-    )
-
     url = "https://web.archive.org/web/20181023002455/https://www.ldlc.com/informatique/pieces-informatique/processeur/c4300/"
     date = get_iso_date(re.search(r'\d{14}', url).group(0))
     temp = re.search(r'c4300|c4684', url).group(0)
@@ -379,69 +605,212 @@ def test():
             "date": date
     }
 
-    scrape_url(row, db_conn)
-
-    db_conn.close()
+    async def run():
+        async with AsyncFetcher(cache=http_cache.get_cache(), identities=identity_pool.get_pool()) as fetcher:
+            await scrape_url(row, fetcher)
 
+    asyncio.run(run())
+    logger.info(f'CACHE :: {http_cache.get_cache().stats()}')
 
-def chunk_manager(chunk):
-    """ Handles chunk of dataframe containing the URLs to be scraped.
-    Each chunk has its own database connection to allow concurrent reading
-    and writing operations. """
 
-    for index, row in chunk.iterrows():
-        db_conn = psycopg2.connect(
-            host=dbc.HOST,
-            user=dbc.USER,
-            password=dbc.PASSWORD,
-            port=dbc.PORT,
-            database=dbc.DATABASE_NAME,
-        )
+async def process_row(row, fetcher):
+    """ Scrapes a single URL row, returning its outcome ('done', 'skipped' or 'failed') and the number of products written.
+    Database connections are borrowed from the pool for the short read and write phases only, never across an await. """
 
+    with dbc.connection() as db_conn:
         # Creates URL entry if it does not exist already in database
         dbc.init_entry_url_tb(db_conn, row)
 
         # Checks if URL is fully processed
-        if dbc.is_url_proc(db_conn, row):
-            pass
+        is_processed = dbc.is_url_proc(db_conn, row)
+
+    if is_processed:
+        return 'skipped', 0
+
+    products = await scrape_url(row, fetcher)
+    if products is None:
+        return 'failed', 0
+
+    return 'done', products
+
+
+async def process_row_with_retry(row, fetcher, events, worker_id):
+    """ Scrapes a URL row, retrying it on database and network errors with an increasing delay,
+    and reports the outcome to the main process. """
+
+    for attempt in range(1, MAX_URL_ATTEMPTS + 1):
+        try:
+            outcome, products = await process_row(row, fetcher)
+        except RETRYABLE_ERRORS as e:
+            if attempt == MAX_URL_ATTEMPTS:
+                logger.exception(f'ERROR :: URL :: {row["url"]}, {row["date"]}, {row["category"]}, {attempt} attempts')
+                events.put(('failed', worker_id, 0))
+                return
+            logger.warning(f'RETRY :: URL :: {row["url"]}, attempt {attempt}/{MAX_URL_ATTEMPTS}, {e!r}')
+            await asyncio.sleep(URL_RETRY_DELAY * attempt)
+        except Exception:
+            # Layouts the extractors do not handle fail the same way on every attempt
+            logger.exception(f'ERROR :: URL :: {row["url"]}, {row["date"]}, {row["category"]}')
+            events.put(('failed', worker_id, 0))
+            return
         else:
+            events.put((outcome, worker_id, products))
+            return
+
+
+async def consume_queue(worker_id, tasks, events):
+    """ Pulls URL rows from the shared queue one at a time, only when fewer than this process
+    share of URL_CONCURRENCY are in flight, until a None sentinel is received.
+    The fetcher per-host caps are shared the same way between the WORKERS processes,
+    and its requests rotate over the proxies and user-agents of the identity pool. """
+
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(max(1, URL_CONCURRENCY // WORKERS))
+    in_flight = set()
+    cache = http_cache.get_cache()
+
+    async with AsyncFetcher(cache=cache, identities=identity_pool.get_pool(), processes=WORKERS) as fetcher:
+        while True:
+            await slots.acquire()
+            row = await loop.run_in_executor(None, tasks.get)
+            if row is None:
+                break
+
+            task = asyncio.create_task(process_row_with_retry(row, fetcher, events, worker_id))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            task.add_done_callback(lambda task: slots.release())
+
+        await asyncio.gather(*in_flight)
+
+    logger.info(f'WORKER {worker_id} :: CACHE :: {cache.stats()}')
+
+
+def scrape_worker(worker_id, tasks, events):
+    """ Scraping process entry point. Each process runs its own event loop, HTTP connection pool
+    and database connection pool to allow concurrent reading and writing operations. """
+
+    asyncio.run(consume_queue(worker_id, tasks, events))
+
+
+class Progress:
+    """
+    Aggregates the outcomes reported by the scraping processes and logs the throughput.
+
+    Attributes:
+        tasks (Queue): Shared queue of URL rows, whose depth is reported.
+        events (Queue): Queue of (outcome, worker_id, products) events.
+        counts (dict): Number of URLs per outcome.
+        products (int): Number of products written.
+
+    Methods:
+        start(): Starts aggregating events in a background thread.
+        stop(): Processes the remaining events and logs the totals.
+        log(): Logs URLs/s, products/s and queue depth since start.
+    """
+
+    def __init__(self, tasks, events, interval=PROGRESS_INTERVAL):
+        self.tasks = tasks
+        self.events = events
+        self.interval = interval
+        self.counts = {'done': 0, 'skipped': 0, 'failed': 0}
+        self.products = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _handle(self, event):
+        outcome, worker_id, products = event
+        self.counts[outcome] += 1
+        self.products += products
+
+    def _run(self):
+        last_log = time.monotonic()
+        while not self._stop.is_set():
             try:
-                scrape_url(row, db_conn)
-            except psycopg2.errors.InFailedSqlTransaction:
-                logger.exception(f'ERROR :: URL :: {row["url"]}, {row["date"]}, {row["category"]}')
-                db_conn.rollback()
-            except UnboundLocalError:
-                logger.exception(f'ERROR :: URL :: {row["url"]}, {row["date"]}, {row["category"]}')
-            except requests.exceptions.ChunkedEncodingError:
-                continue
+                self._handle(self.events.get(timeout=1))
+            except queue.Empty:
+                pass
+            if time.monotonic() - last_log >= self.interval:
+                self.log()
+                last_log = time.monotonic()
+
+    def log(self):
+        elapsed = time.monotonic() - self.started
+        urls = sum(self.counts.values())
+        try:
+            depth = self.tasks.qsize()
+        except NotImplementedError: # macOS
+            depth = None
+
+        logger.info(f'PROGRESS :: {urls} urls ({self.counts}), {self.products} products, '
+                    f'{urls / elapsed:.2f} urls/s, {self.products / elapsed:.1f} products/s, queue depth: {depth}')
+
+    def start(self):
+        self.started = time.monotonic()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        while True:
+            try:
+                self._handle(self.events.get_nowait())
+            except queue.Empty:
+                break
+        self.log()
+
 
-        db_conn.commit()
-        db_conn.close()
+def put_task(tasks, row, workers):
+    """ Queues a URL row, blocking while the queue is full, unless all workers died. """
 
+    while True:
+        try:
+            tasks.put(row, timeout=5)
+            return
+        except queue.Full:
+            if not any(worker.is_alive() for worker in workers):
+                raise RuntimeError("All scraping processes exited")
+
+
+def main(incremental=True):
+    """ Scrapes all archived snapshots of the targets. Incremental runs only list
+    the captures from the first date not fully scraped yet. """
 
-def main():
     try:
         dbc.db_init()
     except Exception as e:
         logger.exception(f'ERROR :: {e}')
 
-    for target in TARGETS:
+    # Bounded, so that URLs are handed out as workers free up rather than split upfront
+    tasks = multiprocessing.Queue(maxsize=QUEUE_SIZE)
+    events = multiprocessing.Queue()
 
-        df = get_archive_urls(target["url"])
-        # Filters out already processed urls to adapt chunk size
-        df = process_df(df, target)
+    workers = [multiprocessing.Process(target=scrape_worker, args=(worker_id, tasks, events)) for worker_id in range(WORKERS)]
+    for worker in workers:
+        worker.start()
 
-        if int(df.shape[0] / multiprocessing.cpu_count()) >= 1:
-            chunk_size = int(df.shape[0] / multiprocessing.cpu_count())
-        else:
-            chunk_size = 1
+    progress = Progress(tasks, events)
+    progress.start()
 
-        try:
-            chunks = [df.iloc[df.index[i:i + chunk_size]] for i in range(0, df.shape[0], chunk_size)]
-            with multiprocessing.Pool(processes=multiprocessing.cpu_count()) as pool:
-                pool.map(chunk_manager, chunks)
-        except Exception as e:
-            logger.exception(f"ERROR :: CHUNK :: {e}")
+    try:
+        for target in TARGETS:
+            from_date = dbc.get_resume_date(target["category"]) if incremental else None
+            df = get_archive_urls(target["url"], from_date=from_date)
+            logger.info(f'CDX :: {target["category"]}, {df.shape[0]} days listed since {from_date}')
+            # Filters out already processed urls
+            df = process_df(df, target)
+
+            for row in df[['url', 'category', 'date']].to_dict(orient='records'):
+                put_task(tasks, row, workers)
+    except Exception as e:
+        logger.exception(f"ERROR :: QUEUE :: {e}")
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                put_task(tasks, None, workers)
+        for worker in workers:
+            worker.join()
+        progress.stop()
 
 
 if __name__ == '__main__':
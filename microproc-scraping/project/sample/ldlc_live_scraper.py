@@ -1,10 +1,18 @@
-from playwright.sync_api import sync_playwright
-import re, datetime, json, pathlib
-import pandas as pd
+from playwright.async_api import async_playwright
+import asyncio, re, datetime, json, logging, pathlib, csv, textwrap, threading, time
+import project.sample.db_conn as dbc
+import project.sample.ldlc_archive_scraper as las
+import project.sample.identity_pool as identity_pool
+from project.sample.async_fetcher import AsyncFetcher
 
 today = datetime.date.today()
 
 ROOT_DIR = pathlib.Path(__file__).resolve().parent
+DATA_DIR = pathlib.Path(ROOT_DIR.parent, 'data')
+OUTPUT_DIR = pathlib.Path(DATA_DIR, 'output')
+FILE_NAME = pathlib.Path(__file__).stem
+LOGS_DIR = pathlib.Path(ROOT_DIR.parent, "logs")
+LOGS_DIR.mkdir(parents=True, exist_ok=True)
 
 TARGETS = [
     {
@@ -17,79 +25,357 @@ TARGETS = [
     }
 ]
 
+HEADLESS = True
+VIEWPORT = {"width": 1920, "height": 1080}
+# Number of browser contexts loading pages at the same time, for the pages the HTTP path could not read
+PAGE_CONTEXTS = 4
 
-def save_data(retrieved_data, fileName):
-    """ Saves data in JSON and CSV formats. """
+# Files written in OUTPUT_DIR alongside the products table, in the same pass ('json', 'csv'), empty to skip
+EXPORT_FORMATS = ('json', 'csv')
+EXPORT_FILE_NAME = 'live_ldlc_scraped_data'
 
-    json_path = pathlib.Path(f"{ROOT_DIR}\\data\\output", f"{fileName}.json")
-    csv_path = pathlib.Path(f"{ROOT_DIR}\\data\\output", f"{fileName}.csv")
+# Reads the fields of all articles of a listing page in the browser, in a single round trip
+ARTICLES_SCRIPT = """
+articles => articles.map(article => {
+    const data = article.querySelector('div.dsp-cell-right');
+    const find = selector => data ? data.querySelector(selector) : null;
+    const title = find('h3.title-3');
+    const info = find('p.desc');
+    const price = find('div.price div.price');
+    return {
+        sku: article.getAttribute('data-id'),
+        title: title ? title.textContent.trim() : null,
+        info: info ? info.textContent.trim() : null,
+        price_html: price ? price.innerHTML.trim() : null,
+    };
+})
+"""
 
-    # Writes JSON files:
-    with json_path.open("w", encoding="UTF-8") as target: 
-        json.dump(retrieved_data, target, indent=4, ensure_ascii=False)
+""" LOGGER CONFIGURATION """
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
 
-    # Writes CSV files:
-    df = pd.read_json(json_path, encoding='utf-8-sig')
-    df.to_csv(csv_path, index = None, encoding='utf-8-sig')
+log_file_name = f"{FILE_NAME}_{datetime.datetime.now():%Y%m%d_%H%M%S}.log"
+log_file_path = pathlib.Path(LOGS_DIR, log_file_name)
+file_handler = logging.FileHandler(log_file_path)
+logger.addHandler(file_handler)
 
+formatter = logging.Formatter('%(asctime)s :: %(name)s :: %(levelname)-8s :: %(message)s')
+stream_handler = logging.StreamHandler()
+stream_handler.setFormatter(formatter)
+logger.addHandler(stream_handler)
 
-def main():
-    """ Scrapes data of current day from LDLC. """
 
-    dataset = []
+class SnapshotExport:
+    """
+    Single-pass writer of the live snapshot to JSON and/or CSV files in OUTPUT_DIR,
+    rows being appended as pages are scraped instead of reread from a first file.
 
-    for target in TARGETS:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context()
-            page = context.new_page()
-            page.set_viewport_size(viewport_size={"width": 1920, "height": 1080})
+    Attributes:
+        file_name (str): Name of the files, without extension.
+        formats (tuple): Formats written, among 'json' and 'csv'.
+        rows (int): Number of rows written.
 
-            page.goto(target["url"])
+    Methods:
+        write(products): Appends products to the files.
+        close(): Terminates and closes the files.
+    """
 
-            pagination = page.locator('ul.pagination li').all()
-            num_pages = len(pagination) - 1
+    def __init__(self, file_name=EXPORT_FILE_NAME, formats=EXPORT_FORMATS):
+        self.file_name = file_name
+        self.formats = formats
+        self.rows = 0
+        self._json_file = self._csv_file = self._csv_writer = None
 
-            for i in range(1, num_pages + 1):
-                if i != 1:
-                    page.goto(target["url"] + f"page{i}")
-                else:
-                    pass
+        OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-                # Get all articles on current page
-                articles = page.locator('li.pdt-item').all() # .query_all()
-                for article in articles:
-                    article_data = article.locator('div.dsp-cell-right')
+        if 'json' in formats:
+            self._json_file = pathlib.Path(OUTPUT_DIR, f"{file_name}.json").open("w", encoding="UTF-8")
+            self._json_file.write("[")
+        if 'csv' in formats:
+            self._csv_file = pathlib.Path(OUTPUT_DIR, f"{file_name}.csv").open("w", newline='', encoding='utf-8-sig')
+            self._csv_writer = csv.DictWriter(self._csv_file, fieldnames=dbc.ProductWriter.COLUMNS)
+            self._csv_writer.writeheader()
 
-                    title = article_data.locator('h3.title-3').text_content().strip()
+    def write(self, products):
+        if self._json_file is not None:
+            for i, product in enumerate(products, start=self.rows):
+                self._json_file.write(("," if i else "") + "\n" + textwrap.indent(json.dumps(product, indent=4, ensure_ascii=False), "    "))
+        if self._csv_writer is not None:
+            self._csv_writer.writerows(products)
 
-                    article_info = article_data.locator('p.desc').text_content().strip()
-                    desc = re.sub(r'\([^()]*\)', '', article_info).strip()
-                    try:
-                        model = re.search(r'\(([^()]+)\)', article_info).group(1)
-                    except AttributeError:
-                        model = None
+        self.rows += len(products)
 
-                    availability = article_data.locator('div[class^="modal-stock-web pointer stock stock"]').text_content().strip()
+    def close(self):
+        if self._json_file is not None:
+            self._json_file.write("\n]\n" if self.rows else "]\n")
+            self._json_file.close()
+        if self._csv_file is not None:
+            self._csv_file.close()
 
-                    price_info = article_data.locator('div.price div.price').inner_html().strip().split('<sup>')
-                    integral = price_info[0][:-1].replace('&nbsp;', '')
-                    fractional = re.search(r'\d+', price_info[1]).group(0)
-                    price = float(integral + '.' + fractional)
 
-                    dataset.append({
-                        'category': target["category"],
-                        'title': title,
-                        'desc': desc,
-                        'model': model,
-                        'price': price,
-                        'date': today.isoformat()
-                    })
+class SnapshotSink:
+    """
+    Writes live products to the products table page by page, as they are scraped, with the
+    archive scraper schema: rows whose (date, sku) pair already exists are skipped.
+    Pages are written in worker threads, off the event loop, the export files and counters
+    being updated under a lock.
 
-            browser.close()
-    
-    save_data(dataset, 'live_ldlc_scraped_data')
+    Attributes:
+        export (SnapshotExport): Optional export files written in the same pass.
+        counters (dict): ProductWriter counters summed over all pages.
+
+    Methods:
+        write(products): Writes one page of products (coroutine).
+        close(): Closes the export files.
+    """
+
+    def __init__(self, export=None):
+        self.export = export
+        self.counters = {'written': 0, 'skipped': 0, 'failed': 0, 'round_trips': 0}
+        self._lock = threading.Lock()
+
+    async def write(self, products):
+        await asyncio.to_thread(self._write, products)
+
+    def _write(self, products):
+        with dbc.connection() as db_conn:
+            writer = dbc.ProductWriter(db_conn)
+            for product in products:
+                writer.add(product)
+            writer.flush()
+
+        stats = writer.stats()
+        with self._lock:
+            for counter in self.counters:
+                self.counters[counter] += stats[counter]
+
+            if self.export is not None:
+                self.export.write(products)
+
+    def close(self):
+        if self.export is not None:
+            self.export.close()
+
+
+def listing_url(target, i):
+    """ Returns the url of the i-th listing page of a target. """
+
+    url = f"https://{target['url']}"
+    if i != 1:
+        url += f"page{i}"
+
+    return url
+
+
+def parse_article(article, category):
+    """ Builds a products row from the raw fields read in the browser. """
+
+    title = article['title']
+
+    desc = re.sub(r'\([^()]*\)', '', article['info']).strip()
+    try:
+        model = re.search(r'\(([^()]+)\)', article['info']).group(1)
+    except AttributeError:
+        model = ''
+
+    price_info = article['price_html'].split('<sup>')
+    integral = price_info[0][:-1].replace('&nbsp;', '')
+    fractional = re.search(r'\d+', price_info[1]).group(0)
+    price = float(integral + '.' + fractional)
+
+    # Same truncation as the archive scraper, to fit the products table
+    return {
+        'sku': article['sku'],
+        'category': category,
+        'title': title[:120],
+        'description': desc[:140],
+        'model': model,
+        'price': price,
+        'date': today.isoformat()
+    }
+
+
+def is_valid(products):
+    """ Checks that a listing page gave articles, all with a sku, a title and a price. """
+
+    return bool(products) and all(product['sku'] and product['title'] and product['price'] is not None for product in products)
+
+
+async def read_articles(page, category):
+    """ Returns the products of the listing page loaded in page. """
+
+    articles = await page.eval_on_selector_all('li.pdt-item', ARTICLES_SCRIPT)
+
+    return [parse_article(article, category) for article in articles]
+
+
+class BrowserFallback:
+    """
+    Chromium instance shared by all pages the HTTP path could not read, launched on first use only.
+    Each context goes through its own identity of the pool.
+
+    Attributes:
+        headless (bool): Whether the browser runs headless.
+        identities (IdentityPool): Pool of proxies and user-agents the contexts are opened with.
+        slots (Semaphore): Caps the number of contexts open at the same time.
+
+    Methods:
+        new_context(identity): Returns a new context with the proxy and user-agent of identity, launching the browser if needed.
+        close(): Closes the browser if it was launched.
+    """
+
+    def __init__(self, identities, headless=HEADLESS, max_contexts=PAGE_CONTEXTS):
+        self.headless = headless
+        self.identities = identities
+        self.slots = asyncio.Semaphore(max_contexts)
+        self._lock = asyncio.Lock()
+        self._playwright = None
+        self._browser = None
+
+    async def new_context(self, identity):
+        async with self._lock:
+            if self._browser is None:
+                self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=self.headless, **identity_pool.launch_options(self.identities))
+
+        return await self._browser.new_context(viewport=VIEWPORT, user_agent=identity.user_agent, proxy=identity.playwright_proxy())
+
+    async def close(self):
+        if self._browser is not None:
+            await self._browser.close()
+            await self._playwright.stop()
+            self._browser = self._playwright = None
+
+
+async def scrape_page_http(fetcher, target, i):
+    """ Reads a listing page from its static HTML with the archive scraper extractors.
+    Returns its products and the number of listing pages. """
+
+    content = await fetcher.fetch(listing_url(target, i))
+    soup, page_prices = las.parse_page(content)
+
+    row = {'category': target["category"], 'date': today.isoformat()}
+    products = [las.Product(article, row, page_prices).to_dict() for article in las.get_page_articles(soup)]
+    # The last pagination item links to the next page
+    num_pages = max(len(soup.select('ul.pagination li')) - 1, 1)
+
+    return products, num_pages
+
+
+async def scrape_page_browser(browser, target, i):
+    """ Reads a listing page in a new browser context.
+    Returns its products and the number of listing pages. """
+
+    async with browser.slots:
+        identity = browser.identities.acquire()
+        context = await browser.new_context(identity)
+        try:
+            page = await context.new_page()
+            start = time.perf_counter()
+            try:
+                response = await page.goto(listing_url(target, i))
+            except Exception:
+                browser.identities.report(identity, ok=False)
+                raise
+            browser.identities.report(identity, ok=response is not None and identity_pool.is_healthy_status(response.status), latency=time.perf_counter() - start)
+            products = await read_articles(page, target["category"])
+            num_pages = max(await page.locator('ul.pagination li').count() - 1, 1)
+        finally:
+            await context.close()
+
+    return products, num_pages
+
+
+async def scrape_page(fetcher, browser, sink, target, i):
+    """ Scrapes a listing page through plain HTTP, falling back to the browser
+    when the page could not be read or failed validation, and hands its products to the sink. """
+
+    try:
+        products, num_pages = await scrape_page_http(fetcher, target, i)
+        reason = None if is_valid(products) else f'{len(products)} articles, some missing a title or price'
+    except Exception as e:
+        reason = repr(e)
+
+    if reason is None:
+        path = 'http'
+    else:
+        logger.warning(f'PAGE :: {target["category"]}, page: {i}, falling back to the browser, {reason}')
+        products, num_pages = await scrape_page_browser(browser, target, i)
+        path = 'browser'
+
+    await sink.write(products)
+    logger.info(f'PAGE :: {target["category"]}, page: {i}, path: {path}, {len(products)} products')
+
+    return {'category': target["category"], 'page': i, 'path': path, 'products': products, 'num_pages': num_pages}
+
+
+async def scrape_target(fetcher, browser, sink, target):
+    """ Scrapes all listing pages of a target. The first page gives the number of pages,
+    the others being scraped concurrently. Returns the pages read, in order, failed ones being logged and skipped. """
+
+    first_page = await scrape_page(fetcher, browser, sink, target, 1)
+    other_pages = await asyncio.gather(*(
+        scrape_page(fetcher, browser, sink, target, i) for i in range(2, first_page['num_pages'] + 1)
+    ), return_exceptions=True)
+
+    pages = [first_page]
+    for i, page in enumerate(other_pages, start=2):
+        if isinstance(page, Exception):
+            logger.error(f'ERROR :: PAGE :: {target["category"]}, page: {i}, {page!r}', exc_info=page)
+        else:
+            pages.append(page)
+
+    return pages
+
+
+async def scrape(sink, targets=TARGETS, headless=HEADLESS):
+    """ Scrapes all targets, the browser being launched only if a page needs it.
+    Products are handed to the sink page by page. Returns the path taken by each page read.
+    Requests and browser contexts rotate over the proxies and user-agents of the identity pool. """
+
+    identities = identity_pool.get_pool()
+    browser = BrowserFallback(identities, headless)
+
+    try:
+        async with AsyncFetcher(identities=identities) as fetcher:
+            results = await asyncio.gather(*(scrape_target(fetcher, browser, sink, target) for target in targets), return_exceptions=True)
+    finally:
+        await browser.close()
+
+    paths = []
+    for target, target_pages in zip(targets, results):
+        # A target whose first page failed is skipped, the other targets being kept
+        if isinstance(target_pages, Exception):
+            logger.error(f'ERROR :: TARGET :: {target["category"]}, {target_pages!r}', exc_info=target_pages)
+            continue
+        paths += [
+            {'category': page['category'], 'page': page['page'], 'path': page['path'], 'products': len(page['products'])}
+            for page in target_pages
+        ]
+
+    return paths
+
+
+def main(export_formats=EXPORT_FORMATS):
+    """ Scrapes data of current day from LDLC into the products table,
+    and into export files if export_formats is not empty. """
+
+    try:
+        dbc.db_init()
+    except Exception as e:
+        logger.exception(f'ERROR :: {e}')
+
+    sink = SnapshotSink(SnapshotExport(formats=export_formats) if export_formats else None)
+    try:
+        paths = asyncio.run(scrape(sink))
+    finally:
+        sink.close()
+
+    browser_pages = sum(page['path'] == 'browser' for page in paths)
+    products = sum(page['products'] for page in paths)
+    logger.info(f'RUN :: {products} products, {len(paths) - browser_pages} pages read through HTTP, {browser_pages} through the browser, {sink.counters}')
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -1,10 +1,13 @@
 import json
 import logging
+import os
 import pathlib
 import re
-import random
-from datetime import datetime
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
 
+import aiohttp
 import asyncio
 from playwright.async_api import async_playwright
 from fake_useragent import UserAgent
@@ -27,6 +30,34 @@ COUNTRIES = [
     {'country_code': 'US', 'country_name': 'United States'}
 ]
 
+HEADLESS = False
+# Number of country lists loaded at the same time
+HARVEST_CONCURRENCY = 4
+
+# Endpoint requested through each candidate proxy, which can be pointed at a local server
+PROBE_URL = os.environ.get('PROXY_PROBE_URL', 'http://httpbin.org/ip')
+PROBE_CONCURRENCY = 100
+PROBE_ATTEMPTS = 3
+PROBE_TIMEOUT = 10
+# Proxies answering less often or slower than this are left out of the pool
+MIN_SUCCESS_RATE = 2 / 3
+MAX_LATENCY = 5
+# Lifetime of a validated proxy in the pool, free proxies rarely staying up for long
+PROXY_TTL = timedelta(hours=6)
+
+# Reads the address cells and anonymity level of all rows of a list, in a single round trip
+PROXY_ROWS_SCRIPT = """
+rows => rows.map(row => {
+    const cells = Array.from(row.querySelectorAll('td'));
+    const level = cells.length ? cells[cells.length - 1].querySelector('span') : null;
+    return {
+        ip: cells.length > 0 ? cells[0].textContent : '',
+        port: cells.length > 1 ? cells[1].textContent : '',
+        level: level ? level.getAttribute('class') || '' : '',
+    };
+})
+"""
+
 
 """ LOGGER CONFIGURATION """
 logger = logging.getLogger(__name__)
@@ -44,63 +75,140 @@ logger.addHandler(stream_handler)
 
 
 def save_data(retrieved_data, file_name):
-    """ Saves data in JSON and CSV formats. """
+    """ Saves data in JSON format. """
 
     json_path = pathlib.Path(DATA_DIR, f"{file_name}.json")
 
     # write JSON files:
-    with json_path.open("w", encoding="UTF-8") as target: 
+    with json_path.open("w", encoding="UTF-8") as target:
         json.dump(retrieved_data, target, indent=4, ensure_ascii=False)
 
 
-async def get_proxies_pw():
-    """ Scrapes the Proxynova website to retrieve a list of proxies. """
+def parse_proxy_row(row, country):
+    """ Builds a candidate proxy from the raw cells of a list row, or returns None if it is not an elite one. """
 
-    async with async_playwright() as p:
-        ua = UserAgent()
-        user_agent = ua.chrome
+    if not row['level'].startswith('proxy_elite'):
+        return None
+
+    # The address is written by an inline script preceding it in the cell
+    ip = re.search(r'\)(\d+\.\d+\.\d+\.\d+)', row['ip'])
+    port = re.search(r'(\d+)', row['port'])
+    if ip is None or port is None:
+        return None
+
+    return {'ip': ip.group(1), 'port': port.group(1), 'country': country['country_name']}
 
-        browser = await p.chromium.launch(headless=False)
-        context = await browser.new_context(user_agent=user_agent)
-        page = await context.new_page()
-        await page.set_viewport_size(viewport_size={"width": 1920, "height": 1080})        
 
-        proxy = {}
-        u = list()
+async def harvest_country(browser, user_agent, country, semaphore):
+    """ Scrapes the Proxynova list of a country in its own context. """
 
-        for country in COUNTRIES:
-            url = f'https://www.proxynova.com/proxy-server-list/country-{country["country_code"]}/'
+    url = f'https://www.proxynova.com/proxy-server-list/country-{country["country_code"]}/'
 
+    async with semaphore:
+        context = await browser.new_context(user_agent=user_agent, viewport={"width": 1920, "height": 1080})
+        try:
+            page = await context.new_page()
             await page.goto(url)
             await page.wait_for_selector('table[id="tbl_proxy_list"]')
-            
-            rows = await page.locator('table[id="tbl_proxy_list"] > tbody > tr').all()
-            for row in rows:
-                cells = await row.locator('td').all()
-                
-                elite_check = await cells[-1].locator('span').get_attribute('class')
-
-                if elite_check.startswith('proxy_elite'):
-                    try: 
-                        proxy['ip'] = re.search(r'\)(\d+\.\d+\.\d+\.\d+)', await cells[0].text_content()).group(1)
-                    except Exception as e:
-                        proxy['ip'] = None
-                    try:
-                        proxy['port'] = re.search(r'(\d+)', await cells[1].text_content()).group(1)
-                    except Exception as e:
-                        proxy['port'] = None
-                    proxy['country'] = country['country_name']
-                    if proxy['port'] is not None:
-                        u.append(proxy)
-                        logger.info(f'New proxy added: {proxy}')
-                    proxy={}
-                else:
-                    continue
-
-            await page.wait_for_timeout(random.randint(8, 20) * 1000)
-        
-        save_data(u, 'proxies')
+            rows = await page.eval_on_selector_all('table[id="tbl_proxy_list"] > tbody > tr', PROXY_ROWS_SCRIPT)
+        finally:
+            await context.close()
+
+    candidates = [proxy for proxy in (parse_proxy_row(row, country) for row in rows) if proxy is not None]
+    logger.info(f'HARVEST :: {country["country_name"]}, {len(candidates)} elite proxies out of {len(rows)}')
+
+    return candidates
+
+
+async def harvest(headless=HEADLESS):
+    """ Scrapes the Proxynova lists of all countries concurrently, returning unique candidate proxies. """
+
+    user_agent = UserAgent().chrome
+    semaphore = asyncio.Semaphore(HARVEST_CONCURRENCY)
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=headless)
+        try:
+            results = await asyncio.gather(*(harvest_country(browser, user_agent, country, semaphore) for country in COUNTRIES), return_exceptions=True)
+        finally:
+            await browser.close()
+
+    candidates = {}
+    for country, result in zip(COUNTRIES, results):
+        if isinstance(result, Exception):
+            logger.error(f'HARVEST :: ERROR :: {country["country_name"]}, {result!r}')
+            continue
+        for proxy in result:
+            candidates.setdefault((proxy['ip'], proxy['port']), proxy)
+
+    return list(candidates.values())
+
+
+async def probe_proxy(session, proxy, semaphore, probe_url=PROBE_URL):
+    """ Requests probe_url through a proxy PROBE_ATTEMPTS times.
+    Returns the proxy with its success rate and median latency (seconds, None if it never answered). """
+
+    latencies = []
+
+    async with semaphore:
+        for _ in range(PROBE_ATTEMPTS):
+            start = time.perf_counter()
+            try:
+                async with session.get(probe_url, proxy=f'http://{proxy["ip"]}:{proxy["port"]}') as response:
+                    await response.read()
+                    if response.status == 200:
+                        latencies.append(time.perf_counter() - start)
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+                continue
+
+    return dict(
+        proxy,
+        success_rate=round(len(latencies) / PROBE_ATTEMPTS, 3),
+        latency=round(statistics.median(latencies), 3) if latencies else None,
+    )
+
+
+def score_proxy(proxy):
+    """ Scores a probed proxy, reliable and fast ones scoring highest. """
+
+    return round(proxy['success_rate'] / (1 + proxy['latency']), 3)
+
+
+async def validate(candidates, probe_url=PROBE_URL):
+    """ Probes all candidate proxies in parallel, returning the live and fast ones
+    scored and stamped with their expiry date, best scores first. """
+
+    semaphore = asyncio.Semaphore(PROBE_CONCURRENCY)
+    connector = aiohttp.TCPConnector(limit=PROBE_CONCURRENCY, force_close=True)
+    timeout = aiohttp.ClientTimeout(total=PROBE_TIMEOUT)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        probed = await asyncio.gather(*(probe_proxy(session, proxy, semaphore, probe_url) for proxy in candidates))
+
+    checked_at = datetime.now(timezone.utc)
+    pool = []
+    for proxy in probed:
+        if proxy['success_rate'] < MIN_SUCCESS_RATE or proxy['latency'] > MAX_LATENCY:
+            continue
+        proxy['score'] = score_proxy(proxy)
+        proxy['checked_at'] = checked_at.isoformat(timespec='seconds')
+        proxy['expires_at'] = (checked_at + PROXY_TTL).isoformat(timespec='seconds')
+        pool.append(proxy)
+
+    logger.info(f'PROBE :: {len(pool)} live proxies out of {len(candidates)}')
+
+    return sorted(pool, key=lambda proxy: proxy['score'], reverse=True)
+
+
+async def get_proxies_pw():
+    """ Scrapes the Proxynova website to retrieve a list of proxies,
+    and saves the ones answering through PROBE_URL. """
+
+    candidates = await harvest()
+    pool = await validate(candidates)
+
+    save_data(pool, 'proxies')
 
 
 if __name__ == '__main__':
-    asyncio.run(get_proxies_pw())
\ No newline at end of file
+    asyncio.run(get_proxies_pw())
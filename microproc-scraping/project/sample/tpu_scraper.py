@@ -3,12 +3,14 @@ import logging
 import pathlib
 import re
 import time, random
+from collections import defaultdict
 from datetime import datetime
 
 import pandas
 import numpy
 import psycopg2
 import project.sample.db_conn as dbc
+import project.sample.identity_pool as identity_pool
 import requests
 from bs4 import BeautifulSoup
 
@@ -24,6 +26,17 @@ LOGS_DIR.mkdir(parents=True, exist_ok=True)
 
 TARGETS = ['cpu', 'gpu']
 
+# Number of browser contexts scraping TechPowerUp at the same time
+WORKERS = 3
+# Ceiling of the ones sent from a same IP, the direct connection being shared by its workers
+MAX_REQUESTS_PER_IP_PER_MINUTE = 12
+# Ceiling of page loads and clicks sent to TechPowerUp by all workers together, whatever the number of proxies.
+# The overall rate is the per-IP one times the number of IPs in use, up to it
+MAX_REQUESTS_PER_MINUTE = 60
+# Random pause of each worker between two actions, in seconds
+POLITENESS_DELAY = (8, 14)
+HEADLESS = True
+
 """ LOGGER CONFIGURATION """
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -42,15 +55,7 @@ logger.addHandler(stream_handler)
 def get_soup(url):
     """ Gets soup from url. """
 
-    headers = {'User-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/107.0.0.0 Safari/537.36 OPR/93.0.0.0'}
-
-    while True:
-        try:
-            response = requests.get(url, headers=headers)
-            break
-        except requests.exceptions.ConnectionError:
-            print("requests.exceptions.ConnectionError")
-            time.sleep(10)
+    response = identity_pool.get(url)
 
     return BeautifulSoup(response.content, 'html.parser')
 
@@ -82,6 +87,99 @@ def save_data(retrieved_data, file_name):
         json.dump(retrieved_data, target, indent=4, ensure_ascii=False)
 
 
+class CheckpointStore:
+    """
+    Append-only JSON Lines log of scraped products, written as soon as each product is done.
+    It is replayed over the whole specs file on startup and compacted back into it on demand.
+
+    Attributes:
+        target (str): Product category ('cpu' or 'gpu').
+        path (Path): Path of the JSON Lines log.
+
+    Methods:
+        append(element): Logs a scraped product.
+        replay(products): Applies the logged products to a list of products.
+        load(): Returns the whole specs file with the log replayed over it.
+        compact(products): Rewrites the whole specs file and empties the log.
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self.path = pathlib.Path(DATA_DIR, f'{target}_whole_specs.checkpoint.jsonl')
+        self._file = None
+
+    def append(self, element):
+        if self._file is None:
+            is_truncated = False
+            if self.path.is_file() and self.path.stat().st_size > 0:
+                with self.path.open("rb") as file:
+                    file.seek(-1, 2)
+                    is_truncated = file.read(1) != b'\n'
+
+            self._file = self.path.open("a", encoding="UTF-8")
+            # Terminates a line left truncated by a crash, so that it does not swallow the next entry
+            if is_truncated:
+                self._file.write('\n')
+        self._file.write(json.dumps(element, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def replay(self, products):
+        if not self.path.is_file():
+            return 0
+
+        by_model = {product['model']: product for product in products}
+        count = 0
+
+        with self.path.open("r", encoding="UTF-8") as file:
+            for line in file:
+                # A crash while appending can leave a truncated last line
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+                if entry['model'] in by_model:
+                    by_model[entry['model']].update(entry)
+                else:
+                    products.append(entry)
+                    by_model[entry['model']] = entry
+                count += 1
+
+        logger.info(f"CHECKPOINT :: {self.target}, {count} products replayed")
+
+        return count
+
+    def load(self):
+        products = load_data(f'{self.target}_whole_specs')
+        self.replay(products)
+
+        return products
+
+    def compact(self, products):
+        self.close()
+
+        # Writes to a temporary file first, so that a crash never leaves a truncated specs file
+        json_path = pathlib.Path(DATA_DIR, f"{self.target}_whole_specs.json")
+        temp_path = json_path.with_suffix('.json.tmp')
+        with temp_path.open("w", encoding="UTF-8") as file:
+            json.dump(products, file, indent=4, ensure_ascii=False)
+        temp_path.replace(json_path)
+
+        self.path.unlink(missing_ok=True)
+
+
+def compact_checkpoint(target):
+    """ Merges the checkpoint log of a target into its whole specs file. """
+
+    store = CheckpointStore(target)
+    store.compact(store.load())
+
+
 def remove_ordinals(string):    
     """ Removes ordinal characters from string using regex. """
 
@@ -112,219 +210,416 @@ def get_unique_keys(dict_list):
                 unique_keys.append(key)
 
 
-async def scrape():
-    """ Scrapes TechPowerUp CPU and GPU data. """
+class TokenBucket:
+    """
+    Asynchronous token bucket shared by workers to cap their request rate.
+    A bucket with a parent also consumes a token of the parent, e.g. a per-IP bucket and the overall one.
+
+    Attributes:
+        rate (float): Tokens added per second.
+        capacity (int): Maximum number of tokens, i.e. allowed burst.
+        parent (TokenBucket): Optional bucket capping the rate of several buckets together.
+
+    Methods:
+        acquire(): Waits until a token is available and consumes it.
+    """
+
+    def __init__(self, rate, capacity=1, parent=None):
+        self.rate = rate
+        self.capacity = capacity
+        self.parent = parent
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    break
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+        if self.parent is not None:
+            await self.parent.acquire()
+
+
+async def polite_wait(page):
+    """ Waits a random number of seconds, to look less like a bot. """
+
+    await page.wait_for_timeout(random.randint(*POLITENESS_DELAY) * 1000)
+
+
+def load_url_index(target):
+    """ Loads the model -> spec page URL index of a target. """
+
+    file_path = pathlib.Path(DATA_DIR, f'{target}_spec_urls.json')
+
+    if file_path.is_file():
+        with open(file_path, 'r', encoding="utf8") as file:
+            return json.load(file)
+
+    return {}
+
+
+def save_url_index(url_index, target):
+    """ Saves the model -> spec page URL index of a target. """
+
+    save_data(dict(sorted(url_index.items())), f'{target}_spec_urls')
+
+
+async def index_listing(page, target, limiter, url_index):
+    """ Adds all spec page links of the target listing table to the URL index.
+    Returns the number of new entries. """
+
+    await limiter.acquire()
+    await page.goto(f'https://www.techpowerup.com/{target}-specs/?sort=name')
+    await page.wait_for_selector('table')
+
+    links = await page.eval_on_selector_all(
+        f'table a[href*="/{target}-specs/"]',
+        'links => links.map(link => [link.textContent.trim(), link.href])'
+    )
+
+    count = 0
+    for model, href in links:
+        if model and model not in url_index:
+            url_index[model] = href
+            count += 1
+
+    logger.info(f"INDEX :: {target}, {count} spec page URLs added from the listing")
+
+    return count
+
+
+async def timed_goto(page, url, limiter, latencies):
+    """ Loads url once the limiter allows it, appending the duration of the navigation alone to latencies. """
+
+    await limiter.acquire()
+    start = time.perf_counter()
+    await page.goto(url)
+    latencies.append(time.perf_counter() - start)
+
+
+async def open_spec_page(page, element, target, limiter, url_index, latencies):
+    """ Opens the spec page of a model, directly if its URL is indexed,
+    through the quicksearch otherwise. Returns False if the model could not be found.
+    The durations of the page loads are appended to latencies. """
+
+    if element['model'] in url_index:
+        await timed_goto(page, url_index[element['model']], limiter, latencies)
+        await page.wait_for_selector('div[class="sectioncontainer"]')
+
+        return True
+
+    url = f'https://www.techpowerup.com/{target}-specs/?sort=name'
+
+    await timed_goto(page, url, limiter, latencies)
+    await page.wait_for_selector('input[id="quicksearch"]')
+    await page.wait_for_timeout(1000)
+    await page.type('input[id="quicksearch"]', element['model'])
+
+    try:
+        if target == 'cpu':
+            await page.wait_for_selector('div[class="tablewrapper"] > table > tbody > tr', timeout=(random.randint(*POLITENESS_DELAY) * 1000))
+        elif target == 'gpu':
+            await page.wait_for_selector('div[id="ajaxresults"] > table > tbody > tr', timeout=(random.randint(*POLITENESS_DELAY) * 1000))
+    except:
+        return False
+
+    if target == 'cpu':
+        items = await page.locator('div[class="tablewrapper"] > table > tbody > tr > td > a').all()
+    elif target == 'gpu':
+        items = await page.locator('div[id="ajaxresults"] > table > tbody > tr > td > a').all()
+
+    await polite_wait(page)
+    await limiter.acquire()
+    start = time.perf_counter()
+    await items[0].click()
+
+    # Wait for the next page to load
+    await page.wait_for_selector('div[class="sectioncontainer"]')
+    latencies.append(time.perf_counter() - start)
+    url_index[element['model']] = page.url
+
+    return True
+
+
+async def scrape_product(page, element, target, limiter, url_index, latencies):
+    """ Opens the spec page of a model and adds its specs to the element dictionary.
+    Returns False if the model could not be found. """
+
+    if not await open_spec_page(page, element, target, limiter, url_index, latencies):
+        element['status'] = 'DONE'
+        return False
+
+    if target == 'cpu':
+        sections = await page.locator('section[class="details"] > table > tbody').all()
+    elif target == 'gpu':
+        sections = await page.locator('section[class="details"] > div').all()
+
+    for section in sections:
+        if target == 'cpu':
+            rows = await section.locator('tr').all()
+        elif target == 'gpu':
+            rows = await section.locator('dl').all()
+
+        for row in rows:
+            if target == 'cpu':
+                try:
+                    await page.wait_for_selector('th', timeout=250)
+                    label_co = await row.locator('th').inner_text()
+                    content = await row.locator('td').inner_text()
+                    label = label_co[:-1]
+                except:
+                    continue
+            elif target == 'gpu':
+                label_co = await row.locator('dt').inner_text()
+                content = await row.locator('dd').inner_text()
+                label = label_co
+            element['status'] = 'DONE'
+            element[label] = content
+        logger.info(element)
+
+    return True
+
+
+async def open_identity(browser, identities):
+    """ Opens a browser context with the proxy and user-agent of an identity of the pool.
+    Returns the identity, the context and its page. """
+
+    identity = identities.acquire()
+    context = await browser.new_context(user_agent=identity.user_agent, proxy=identity.playwright_proxy())
+    page = await context.new_page()
+    await page.set_viewport_size(viewport_size={"width": 1920, "height": 1080})
+
+    return identity, context, page
+
+
+async def scrape_worker(worker_id, browser, identities, queue, target, limiters, url_index, checkpoint, report):
+    """ Scrapes products from the queue in its own browser context until the queue is empty.
+    The context is reopened with another identity once the pool evicted its proxy. """
+
+    identity, context, page = await open_identity(browser, identities)
+
+    while True:
+        try:
+            element = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            break
+
+        start = time.perf_counter()
+        # Page loads only, the identity latency leaving out the limiter and politeness waits
+        latencies = []
+        try:
+            status = 'FOUND' if await scrape_product(page, element, target, limiters[identity.proxy_url()], url_index, latencies) else 'NOT FOUND'
+        except Exception as e:
+            logger.exception(f"PRODUCT :: ERROR :: {element['model']}, {identity!r}, {e}")
+            status = 'ERROR'
+        elapsed = time.perf_counter() - start
+        latency = sum(latencies) / len(latencies) if latencies and status != 'ERROR' else None
+        identities.report(identity, ok=status != 'ERROR', latency=latency)
+
+        if element.get('status') == 'DONE':
+            checkpoint.append(element)
+
+        report.append({'model': element['model'], 'worker': worker_id, 'status': status, 'seconds': round(elapsed, 2)})
+        logger.info(f"PRODUCT :: {element['model']}, worker {worker_id}, {status}, {elapsed:.1f} s")
+
+        if identity.evicted:
+            await context.close()
+            identity, context, page = await open_identity(browser, identities)
+            logger.info(f"WORKER :: {worker_id}, switched to {identity!r}")
+        else:
+            await polite_wait(page)
+
+    await context.close()
+
+
+def log_report(report, target):
+    """ Logs a summary of the per-product timings and saves them as JSON. """
+
+    if report:
+        seconds = sorted(entry['seconds'] for entry in report)
+        logger.info(
+            f"REPORT :: {target}, {len(report)} products, "
+            f"mean {sum(seconds) / len(seconds):.1f} s, median {seconds[len(seconds) // 2]:.1f} s, max {seconds[-1]:.1f} s, "
+            f"{sum(entry['status'] == 'ERROR' for entry in report)} errors"
+        )
+    save_data(report, f"{target}_scrape_report")
+
+
+async def scrape(workers=WORKERS, headless=HEADLESS, max_requests_per_minute=MAX_REQUESTS_PER_MINUTE, max_requests_per_ip_per_minute=MAX_REQUESTS_PER_IP_PER_MINUTE, build_index=False, compact=True):
+    """ Scrapes TechPowerUp CPU and GPU data with several browser pages at once.
+    Spec page URLs already resolved are opened directly, and the index can first
+    be filled in bulk from the listing tables with build_index.
+    Each scraped product is checkpointed right away, and a previous interrupted
+    run is resumed from its checkpoint. Workers go through the proxies and user-agents
+    of the identity pool, the request rate being capped per IP and overall. """
+
+    identities = identity_pool.get_pool()
 
     for target in TARGETS:
 
         file_path = pathlib.Path(DATA_DIR, f'{target}_whole_specs.json')
         check = file_path.is_file()
+        checkpoint = CheckpointStore(target)
 
         if check is True:
-            with open(file_path, 'r', encoding="utf8") as file:
-                unique_products = json.load(file)
+            unique_products = checkpoint.load()
         elif check is not True:
             with file_path.open("w", encoding="UTF-8") as path: 
                 unique_products = dbc.get_table_as_records(target)
                 json.dump(unique_products, path, indent=4, ensure_ascii=False)
 
-        url = f'https://www.techpowerup.com/{target}-specs/?sort=name'
+        queue = asyncio.Queue()
+        for element in unique_products:
+            if element.get('status') != 'DONE':
+                queue.put_nowait(element)
+
+        # One bucket per proxy, workers on the direct connection sharing the None one, all drawing on the overall bucket,
+        # which scales with the proxies of the pool, the direct connection alone counting as one IP
+        ips = len({identity.proxy_url() for identity in identities.identities}) or 1
+        overall_limiter = TokenBucket(rate=min(max_requests_per_minute, max_requests_per_ip_per_minute * ips) / 60)
+        limiters = defaultdict(lambda: TokenBucket(rate=max_requests_per_ip_per_minute / 60, parent=overall_limiter))
+        url_index = load_url_index(target)
+        report = []
 
         async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=False)
-            context = await browser.new_context()
-            page = await context.new_page()
-            await page.set_viewport_size(viewport_size={"width": 1920, "height": 1080})
+            browser = await p.chromium.launch(headless=headless, **identity_pool.launch_options(identities))
 
             try:
-                for element in unique_products:
-                    try:
-                        if element['status'] == 'DONE':
-                            continue
-                    except KeyError:
-                        await page.goto(url)
-                        await page.wait_for_selector('input[id="quicksearch"]')
-                        await page.wait_for_timeout(1000)
-                        await page.type('input[id="quicksearch"]', element['model'])
-
-                        try:
-                            if target == 'cpu':
-                                await page.wait_for_selector('div[class="tablewrapper"] > table > tbody > tr', timeout=(random.randint(8, 14) * 1000))
-                            elif target == 'gpu':
-                                await page.wait_for_selector('div[id="ajaxresults"] > table > tbody > tr', timeout=(random.randint(8, 14) * 1000))
-                        except:
-                            element['status'] = 'DONE'
-                            continue
-                        else:
-                            if target == 'cpu':
-                                items = await page.locator('div[class="tablewrapper"] > table > tbody > tr > td > a').all()
-                            elif target == 'gpu':
-                                items = await page.locator('div[id="ajaxresults"] > table > tbody > tr > td > a').all()
-                                print(len(items))
-
-                            await page.wait_for_timeout(random.randint(8, 14) * 1000)
-                            await items[0].click()
-
-                            # Wait for the next page to load
-                            await page.wait_for_selector('div[class="sectioncontainer"]')
-
-                            if target == 'cpu':
-                                sections = await page.locator('section[class="details"] > table > tbody').all()
-                            elif target == 'gpu':
-                                sections = await page.locator('section[class="details"] > div').all()
-
-                            for section in sections:
-                                if target == 'cpu':
-                                    rows = await section.locator('tr').all()
-                                elif target == 'gpu':
-                                    rows = await section.locator('dl').all()
-
-                                for row in rows:
-                                    if target == 'cpu':
-                                        try:
-                                            await page.wait_for_selector('th', timeout=250)
-                                            label_co = await row.locator('th').inner_text()
-                                            content = await row.locator('td').inner_text()
-                                            label = label_co[:-1]
-                                        except:
-                                            continue
-                                    elif target == 'gpu':
-                                        label_co = await row.locator('dt').inner_text()
-                                        content = await row.locator('dd').inner_text()
-                                        label = label_co
-                                    element['status'] = 'DONE'
-                                    element[label] = content
-                                logger.info(element)
-
-                            await page.wait_for_timeout(random.randint(8, 14) * 1000)
-                            continue
+                if build_index:
+                    identity, context, listing_page = await open_identity(browser, identities)
+                    await index_listing(listing_page, target, limiters[identity.proxy_url()], url_index)
+                    await context.close()
+
+                await asyncio.gather(*(
+                    scrape_worker(worker_id, browser, identities, queue, target, limiters, url_index, checkpoint, report)
+                    for worker_id in range(workers)
+                ))
             except Exception as e:
                 logger.exception(e)
             finally:
-                save_data(unique_products, f"{target}_whole_specs")
+                if compact:
+                    checkpoint.compact(unique_products)
+                else:
+                    checkpoint.close()
+                save_url_index(url_index, target)
+                log_report(report, target)
+                logger.info(f"IDENTITIES :: {identities.stats()}")
 
-            browser.close()
+            await browser.close()
 
 
 ###################################################################
 
 
+# Spec columns of each target as (TechPowerUp label, table column, kind, unit divisors).
+# Kinds are 'text', 'upper', 'date', or the nullable dtype of numeric columns, whose
+# values are divided by the divisor of their unit. Unknown units and unparsable values give NA.
+SPECS_SCHEMAS = {
+    'cpu': [
+        ('model', 'model', 'text', None),
+        ('Process Size', 'process_size_nm', 'Int64', {'nm': 1}),
+        ('Transistors', 'transistor_count', 'Int64', {'million': 1}),
+        ('Die Size', 'die_size_mm2', 'Float64', {'mm²': 1}),
+        ('Launch Price', 'launch_price_usd', 'Int64', {'': 1}),
+        ('Release Date', 'release_date', 'date', None),
+        ('# of Cores', 'core_count', 'Int64', {'': 1}),
+        ('# of Threads', 'thread_count', 'Int64', {'': 1}),
+        ('Frequency', 'frequency_ghz', 'Float64', {'GHz': 1, 'MHz': 1000}),
+        ('TDP', 'tdp_w', 'Int64', {'W': 1}),
+        ('Foundry', 'foundry', 'upper', None),
+    ],
+    'gpu': [
+        ('model', 'model', 'text', None),
+        ('Architecture', 'architecture', 'upper', None),
+        ('Process Size', 'process_size_nm', 'Int64', {'nm': 1}),
+        ('Transistors', 'transistor_count', 'Int64', {'million': 1}),
+        ('Density', 'density_m_per_mm2', 'Float64', {'M / mm²': 1, 'K / mm²': 1000}),
+        ('Die Size', 'die_size_mm2', 'Int64', {'mm²': 1}),
+        ('TDP', 'tdp_w', 'Int64', {'W': 1}),
+        ('Memory Size', 'memory_size_gb', 'Float64', {'GB': 1, 'MB': 1024}),
+        ('Memory Type', 'memory_type', 'text', None),
+        ('Launch Price', 'launch_price_usd', 'Int64', {'USD': 1}),
+        ('Release Date', 'release_date', 'date', None),
+        ('Tensor Cores', 'tensor_core_count', 'Int64', {'': 1}),
+        ('Pixel Rate', 'pixel_rate_gpixel_per_s', 'Float64', {'GPixel/s': 1}),
+        ('Texture Rate', 'texture_rate_gtexel_per_s', 'Float64', {'GTexel/s': 1, 'MTexel/s': 1000}),
+        ('FP32 (float)', 'fp32_tflops', 'Float64', {'TFLOPS': 1, 'GFLOPS': 1000}),
+        ('Base Clock', 'base_clock_mhz', 'Int64', {'MHz': 1}),
+        ('Boost Clock', 'boost_clock_mhz', 'Int64', {'MHz': 1}),
+        ('Foundry', 'foundry', 'upper', None),
+    ],
+}
+
+# Optional '$' prefix, a number with thousands separators, an optional 'x <number>' factor, and a unit
+SPEC_VALUE_PATTERN = r'^\s*\$?\s*(?P<number>[\d.,]+)(?:\s*x\s*(?P<factor>[\d.,]+))?\s*(?P<unit>.*?)\s*$'
+
+
+def parse_units(values, units):
+    """ Parses '<number> <unit>' strings into numbers divided by their unit divisor. """
+
+    parts = values.str.extract(SPEC_VALUE_PATTERN)
+    number = pandas.to_numeric(parts['number'].str.replace(',', '', regex=False), errors='coerce')
+    factor = pandas.to_numeric(parts['factor'].str.replace(',', '', regex=False), errors='coerce')
+    number = number.where(factor.isna(), number * factor)
+
+    return number / parts['unit'].map(units)
+
+
+def parse_dates(values):
+    """ Parses TechPowerUp dates ('Sep 1st, 2013' or 'Sep 2013') in bulk. """
+
+    dates = pandas.to_datetime(values.str.replace(r'(\d)(st|nd|rd|th)', r'\1', regex=True), format='%b %d, %Y', errors='coerce')
+
+    return dates.fillna(pandas.to_datetime(values, format='%b %Y', errors='coerce'))
+
+
+def parse_spec_column(values, kind, units):
+    """ Parses a raw spec column into a nullable typed column. """
+
+    # Each distinct value is parsed once, spec columns being highly repetitive
+    codes, uniques = pandas.factorize(values)
+    uniques = pandas.Series(uniques, dtype=object)
+
+    if kind == 'date':
+        parsed = parse_dates(uniques)
+    elif kind in ('text', 'upper'):
+        parsed = uniques.where(uniques.map(lambda x: isinstance(x, str)))
+        if kind == 'upper':
+            parsed = parsed.str.upper()
+        parsed = parsed.mask(parsed.isin(['nan', 'NaN'])).astype('string')
+    else:
+        parsed = parse_units(uniques, units).astype(kind)
+
+    return pandas.Series(parsed.array.take(codes, allow_fill=True), index=values.index)
+
+
 def clean_dataset(df, target):
-    """ Applies a number of transformations to dataframe. """
+    """ Parses the raw TechPowerUp specs into the columns of the specs table. """
 
-    if target == 'cpu':
-        df = df[['model', 'Process Size', 'Transistors', 'Die Size', 'Launch Price', 'Release Date', '# of Cores', '# of Threads', 'Frequency', 'TDP', 'Foundry']]
-        
-        df['Process Size'] = df['Process Size'].apply(lambda x: int(x.replace(' nm', '')) if isinstance(x, str) else x)
-        df['Transistors'] = df['Transistors'].apply(lambda x: int(x.replace(' million', '').replace(',', '')) if isinstance(x, str) else x)
-        df['Die Size'] = df['Die Size'].apply(lambda x: x.replace(' mm²', '') if isinstance(x, str) else x)
-        df['Die Size'] = df['Die Size'].apply(lambda x: int(x.split('x')[0]) * int(x.split('x')[1]) if isinstance(x, str) and 'x' in x else x)
-        df['Launch Price'] = df['Launch Price'].apply(lambda x: int(x.replace('$', '')) if isinstance(x, str) else x)
-        df['Release Date'] = df['Release Date'].apply(lambda x: to_isodate(x) if isinstance(x, str) else x)
-        df['Frequency'] = df['Frequency'].apply(lambda x: float(x.replace(' GHz', '')) if isinstance(x, str) and 'GHz' in x else (float(x.replace(' MHz', '')) / 1000 if isinstance(x, str) and 'MHz' in x else x))
-        df['TDP'] = df['TDP'].apply(lambda x: int(x.replace(' W', '')) if isinstance(x, str) else x)
-        df['Foundry'] = df['Foundry'].apply(lambda x: x.upper() if isinstance(x, str) else x)
-
-        df = df.replace(['nan', 'NaN', numpy.nan], [None, None, None])
-
-        df['Process Size'] = df['Process Size'].astype('str')
-        df['Transistors'] = df['Transistors'].astype('str')
-        df['Die Size'] = df['Die Size'].astype('str')
-        df['Launch Price'] = df['Launch Price'].astype('str')
-        df['Release Date'] = df['Release Date'].astype('str')
-        df['Frequency'] = df['Frequency'].astype('str')
-        df['TDP'] = df['TDP'].astype('str')
-        df['Foundry'] = df['Foundry'].astype('str')
-
-        df = df.rename(columns={
-            'model': 'model',
-            'Process Size': 'process_size_nm',
-            'Transistors': 'transistor_count',
-            'Die Size': 'die_size_mm2',
-            'Launch Price': 'launch_price_usd',
-            'Release Date': 'release_date',
-            '# of Cores': 'core_count',
-            '# of Threads': 'thread_count',
-            'Frequency': 'frequency_ghz',
-            'TDP': 'tdp_w',
-            'Foundry': 'foundry'
-        })
-    
-    elif target == 'gpu':
-        df = df[['model', 'Architecture', 'Process Size', 'Transistors', 'Density', 'Die Size', 'TDP', 'Memory Size', 'Memory Type', 'Launch Price', 'Release Date', 'Tensor Cores', 'Pixel Rate', 'Texture Rate', 'FP32 (float)', 'Base Clock', 'Boost Clock', 'Foundry']]
-    
-        df['Architecture'] = df['Architecture'].apply(lambda x: x.upper() if isinstance(x, str) else None)
-        df['Process Size'] = df['Process Size'].apply(lambda x: int(x.replace(' nm', '')) if isinstance(x, str) else numpy.nan)
-        df['Transistors'] = df['Transistors'].apply(lambda x: int(x.replace(' million', '').replace(',', '')) if isinstance(x, str) else numpy.nan)
-        df['Density'] = df['Density'].apply(lambda x: float(x.replace('M / mm²', '')) if isinstance(x, str) and 'M / mm²' in x else (float(x.replace('K / mm²', '')) / 1000 if isinstance(x, str) and 'K / mm²' in x else numpy.nan))
-        df['Die Size'] = df['Die Size'].apply(lambda x: int(x.replace(' mm²', '')) if isinstance(x, str) else numpy.nan)
-        df['TDP'] = df['TDP'].apply(lambda x: x.replace(' W', '').replace('unknown', '') if isinstance(x, str) else x)
-        df['Memory Size'] = df['Memory Size'].apply(lambda x: float(x.replace(' GB', '')) if isinstance(x, str) and 'GB' in x else (float(x.replace(' MB', '')) / 1024 if isinstance(x, str) and 'MB' in x else numpy.nan))
-        df['Launch Price'] = df['Launch Price'].apply(lambda x: int(x.replace(' USD', '').replace(',', '')) if isinstance(x, str) else numpy.nan)
-        df['Release Date'] = df['Release Date'].apply(lambda x: numpy.nan if x == 'Never Released' else (to_isodate(x) if isinstance(x, str) else x))
-        df['Pixel Rate'] = df['Pixel Rate'].apply(lambda x: float(x.replace(' GPixel/s', '')) if isinstance(x, str) else numpy.nan)
-        df['Texture Rate'] = df['Texture Rate'].apply(lambda x: float(x.replace(' GTexel/s', '').replace(',', '')) if isinstance(x, str) and 'GTexel/s' in x else (float(x.replace(' MTexel/s', '').replace(',', '')) / 1000 if isinstance(x, str) and 'MTexel/s' in x else numpy.nan))
-        df['FP32 (float)'] = df['FP32 (float)'].apply(lambda x: float(x.replace(' TFLOPS', '').replace(',', '')) if isinstance(x, str) and 'TFLOPS' in x else (float(x.replace(' GFLOPS', '').replace(',', '')) / 1000 if isinstance(x, str) and 'GFLOPS' in x else numpy.nan))
-        df['Base Clock'] = df['Base Clock'].apply(lambda x: int(x.replace(' MHz', '')) if isinstance(x, str) else numpy.nan)
-        df['Boost Clock'] = df['Boost Clock'].apply(lambda x: int(x.replace(' MHz', '')) if isinstance(x, str) else numpy.nan)
-        df['Foundry'] = df['Foundry'].apply(lambda x: x.upper() if isinstance(x, str) else None)
-
-        df[['Architecture', 'Release Date', 'Foundry', 'Memory Type']] = df[['Architecture', 'Release Date', 'Foundry', 'Memory Type']].replace(['nan', 'NaN', numpy.nan], None)
-        df[['Architecture', 'Release Date', 'Foundry', 'Memory Type']] = df[['Architecture', 'Release Date', 'Foundry', 'Memory Type']].astype('str')
-
-        df[['Process Size', 'Transistors', 'Die Size', 'TDP', 'Launch Price', 'Base Clock', 'Boost Clock']] = df[['Process Size', 'Transistors', 'Die Size', 'TDP', 'Launch Price', 'Base Clock', 'Boost Clock']].replace(['', 'nan', 'NaN'], numpy.nan)
-        print(df[['Process Size', 'Transistors', 'Die Size', 'TDP', 'Launch Price', 'Base Clock', 'Boost Clock']].to_markdown())
-        df[['Process Size', 'Transistors', 'Die Size', 'TDP', 'Launch Price', 'Base Clock', 'Boost Clock']] = df[['Process Size', 'Transistors', 'Die Size', 'TDP', 'Launch Price', 'Base Clock', 'Boost Clock']].astype('Int64')
-
-        df[['Density', 'Memory Size', 'Pixel Rate', 'Texture Rate', 'FP32 (float)']] = df[['Density', 'Memory Size', 'Pixel Rate', 'Texture Rate', 'FP32 (float)']].astype('Float64')
-        df[['Density', 'Memory Size', 'Pixel Rate', 'Texture Rate', 'FP32 (float)']] = df[['Density', 'Memory Size', 'Pixel Rate', 'Texture Rate', 'FP32 (float)']].replace(['', 'nan', 'NaN'], numpy.nan)
-
-        df = df.rename(columns={
-            'model': 'model',
-            'Architecture': 'architecture',
-            'Process Size': 'process_size_nm',
-            'Transistors': 'transistor_count',
-            'Density': 'density_m_per_mm2',
-            'Die Size': 'die_size_mm2',
-            'TDP': 'tdp_w',
-            'Memory Size': 'memory_size_gb',
-            'Memory Type': 'memory_type',
-            'Launch Price': 'launch_price_usd',
-            'Release Date': 'release_date',
-            'Tensor Cores': 'tensor_core_count',
-            'Pixel Rate': 'pixel_rate_gpixel_per_s',
-            'Texture Rate': 'texture_rate_gtexel_per_s',
-            'FP32 (float)': 'fp32_tflops',
-            'Base Clock': 'base_clock_mhz',
-            'Boost Clock': 'boost_clock_mhz',
-            'Foundry': 'foundry'
-        })
-
-    return df
+    schema = SPECS_SCHEMAS[target]
+    df = df.reindex(columns=[label for label, column, kind, units in schema])
 
+    return pandas.DataFrame({
+        column: parse_spec_column(df[label], kind, units)
+        for label, column, kind, units in schema
+    })
 
-def push_df_to_db(df, target):
-    """ Pushes dataframe content to Postgres tables. """
-
-    db_conn = psycopg2.connect(
-        host=dbc.HOST,
-        user=dbc.USER,
-        password=dbc.PASSWORD,
-        port=dbc.PORT,
-        database=dbc.DATABASE_NAME,
-    )
 
-    data = df.to_dict(orient="records")
-    data = [{k: None if pandas.isna(v) or v == 'None' or v == '' else v for k, v in d.items()} for d in data]
+def push_df_to_db(df, target):
+    """ Pushes dataframe content to Postgres tables in one COPY,
+    upserting rows on the model column. """
 
-    for row_dict in data:
-        if target == 'cpu':
-            dbc.add_data_to_cpu_specs_tb(db_conn, row_dict)
-        elif target == 'gpu':
-            dbc.add_data_to_gpu_specs_tb(db_conn, row_dict)
+    with dbc.connection() as db_conn:
+        count = dbc.copy_upsert(db_conn, df, f'{target}_specs', ('model',))
 
-    db_conn.commit()
-    db_conn.close()
+    logger.info(f"LOAD :: {target}_specs, {count} rows inserted or updated")
 
 
 def transform_load():
@@ -332,7 +627,7 @@ def transform_load():
 
     dbc.create_specs_tables()
     for target in TARGETS:
-        data = load_data(f'{target}_whole_specs')
+        data = CheckpointStore(target).load()
 
         # Convert the list of dictionaries to a pandas DataFrame
         df = pandas.DataFrame(data)